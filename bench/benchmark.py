@@ -0,0 +1,229 @@
+import argparse
+import asyncio
+import json
+import math
+import os
+import sys
+import time
+import tracemalloc
+from aiohttp import web
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+import logger
+import match_decoder
+from cache import caches
+from riot_api import RiotAPI
+from riot_stub import RiotStub, load_fixture
+
+MATCH_BODY = load_fixture("match")
+
+
+async def decode(function):
+    function(MATCH_BODY)
+
+
+SCENARIOS = {
+    "history": lambda client, puuid, args: client.get_recent_matches_infos(
+        puuid, args.server, args.count
+    ),
+    "match": lambda client, puuid, args: client.get_recent_match_info(
+        puuid, args.server, 0
+    ),
+    "profile": lambda client, puuid, args: client.get_profile_info(puuid, args.server),
+    "stats": lambda client, puuid, args: client.get_player_stats(puuid, args.count),
+    # CPU cost of one match-v5 body, selective decoding against a full json.loads
+    "decode": lambda client, puuid, args: decode(match_decoder.decode_match),
+    "loads": lambda client, puuid, args: decode(json.loads),
+}
+
+
+def percentile(samples, p):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[max(math.ceil(p / 100 * len(ordered)) - 1, 0)]
+
+
+def clear_caches():
+    for cache in caches.values():
+        cache.clear()
+
+
+async def run_scenario(client, name, args):
+    latencies = []
+    errors = 0
+    operations = iter(range(args.requests))
+
+    async def worker():
+        nonlocal errors
+        for i in operations:
+            # with --players 0 every operation looks up a new player (cold)
+            player = i % args.players if args.players else i
+            start = time.perf_counter()
+            try:
+                await SCENARIOS[name](client, f"bench-player-{player}", args)
+            except Exception as e:
+                errors += 1
+                logger.log(f"{name} failed: {e!r}", "ERROR")
+            latencies.append(time.perf_counter() - start)
+
+    if args.trace_memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    elapsed = time.perf_counter() - start
+    peak = None
+    if args.trace_memory:
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return {
+        "scenario": name,
+        "operations": len(latencies),
+        "errors": errors,
+        "elapsed": elapsed,
+        "throughput": len(latencies) / elapsed if elapsed else 0.0,
+        "mean": sum(latencies) / len(latencies) if latencies else 0.0,
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+        "p99": percentile(latencies, 99),
+        "peak_memory": peak,
+    }
+
+
+def print_results(results):
+    print(
+        f"{'scenario':<10}{'ops':>7}{'errors':>8}{'ops/s':>10}"
+        f"{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'requests':>10}{'peak KiB':>10}"
+    )
+    for result in results:
+        peak = result.get("peak_memory")
+        print(
+            f"{result['scenario']:<10}{result['operations']:>7}{result['errors']:>8}"
+            f"{result['throughput']:>10.1f}{result['p50'] * 1000:>10.1f}"
+            f"{result['p95'] * 1000:>10.1f}{result['p99'] * 1000:>10.1f}"
+            f"{result.get('riot_requests', '-'):>10}"
+            f"{'-' if peak is None else peak // 1024:>10}"
+        )
+
+
+def compare(results, baseline_path, max_regression):
+    with open(baseline_path, encoding="utf-8") as file:
+        baseline = {result["scenario"]: result for result in json.load(file)}
+    failed = False
+    for result in results:
+        previous = baseline.get(result["scenario"])
+        if previous is None:
+            continue
+        p95_change = result["p95"] / previous["p95"] - 1 if previous["p95"] else 0.0
+        throughput_change = (
+            1 - result["throughput"] / previous["throughput"]
+            if previous["throughput"]
+            else 0.0
+        )
+        status = "ok"
+        if p95_change > max_regression or throughput_change > max_regression:
+            status = "REGRESSION"
+            failed = True
+        print(
+            f"{result['scenario']:<10} p95 {p95_change:+.1%}, "
+            f"throughput {-throughput_change:+.1%} vs baseline: {status}"
+        )
+    return failed
+
+
+async def start_stub(args):
+    stub = RiotStub(
+        args.latency,
+        args.jitter,
+        args.error_rate,
+        args.throttle_rate,
+        args.app_limits,
+        args.method_limits,
+        args.seed,
+    )
+    runner = web.AppRunner(stub.create_app(), access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", 0).start()
+    port = runner.addresses[0][1]
+    return stub, runner, f"http://127.0.0.1:{port}/{{host}}/"
+
+
+async def run(args):
+    stub, runner, base_url = None, None, args.url
+    if base_url is None:
+        stub, runner, base_url = await start_stub(args)
+    results = []
+    try:
+        async with RiotAPI(
+            "bench-key",
+            args.region,
+            match_concurrency=args.match_concurrency,
+            base_url=base_url,
+        ) as client:
+            for name in args.scenarios:
+                clear_caches()
+                before = sum(stub.requests.values()) if stub else None
+                result = await run_scenario(client, name, args)
+                if stub is not None:
+                    result["riot_requests"] = sum(stub.requests.values()) - before
+                results.append(result)
+    finally:
+        if runner is not None:
+            await runner.cleanup()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark RiotAPI against a stub")
+    parser.add_argument(
+        "scenarios", nargs="*", help=f"any of {', '.join(SCENARIOS)}, default all"
+    )
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument(
+        "--players",
+        type=int,
+        default=0,
+        help="number of distinct players to cycle through, 0 for a new one each time",
+    )
+    parser.add_argument("--count", type=int, default=20)
+    parser.add_argument("--region", default="europe")
+    parser.add_argument("--server", default="EUN1")
+    parser.add_argument("--match-concurrency", type=int, default=8)
+    parser.add_argument(
+        "--url", help="use a running stub, e.g. http://host:port/{host}/"
+    )
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--jitter", type=float, default=0.02)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    parser.add_argument("--app-limits", default="500:10,30000:600")
+    parser.add_argument("--method-limits", default="2000:10")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="write results to this file")
+    parser.add_argument("--baseline", help="compare against a previous --json file")
+    parser.add_argument("--max-regression", type=float, default=0.1)
+    parser.add_argument(
+        "--trace-memory",
+        action="store_true",
+        help="report peak Python memory per scenario, slows everything down",
+    )
+    args = parser.parse_args()
+    args.scenarios = args.scenarios or list(SCENARIOS)
+    for name in args.scenarios:
+        if name not in SCENARIOS:
+            parser.error(f"unknown scenario: {name}")
+
+    logger.configure("WARNING")
+    results = asyncio.run(run(args))
+    print_results(results)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as file:
+            json.dump(results, file, indent=2)
+    if args.baseline and compare(results, args.baseline, args.max_regression):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,276 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import time
+import zlib
+from aiohttp import web
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), "fixtures")
+
+# the stub serves every player's history from this many synthetic matches
+MATCHES_PER_PLAYER = 1000
+MATCH_SPACING = 1800
+
+
+def load_fixture(name):
+    with open(os.path.join(FIXTURES_DIR, f"{name}.json"), encoding="utf-8") as file:
+        # stored as compact bytes, placeholders are swapped per request
+        return json.dumps(json.load(file), separators=(",", ":")).encode()
+
+
+def parse_rate_limits(header):
+    return [tuple(int(x) for x in part.split(":")) for part in header.split(",")]
+
+
+class RateLimitCounter:
+    def __init__(self, limits):
+        self.limits = parse_rate_limits(limits)
+        self.windows = {seconds: [0, 0.0] for _, seconds in self.limits}
+
+    def hit(self, now):
+        allowed = True
+        for limit, seconds in self.limits:
+            window = self.windows[seconds]
+            if now >= window[1]:
+                window[0] = 0
+                window[1] = now + seconds
+            if window[0] >= limit:
+                allowed = False
+        if allowed:
+            for window in self.windows.values():
+                window[0] += 1
+        return allowed
+
+    def header(self):
+        return ",".join(f"{limit}:{seconds}" for limit, seconds in self.limits)
+
+    def count_header(self):
+        return ",".join(
+            f"{self.windows[seconds][0]}:{seconds}" for _, seconds in self.limits
+        )
+
+
+class RiotStub:
+    def __init__(
+        self,
+        latency=0.05,
+        jitter=0.02,
+        error_rate=0.0,
+        throttle_rate=0.0,
+        app_limits="500:10,30000:600",
+        method_limits="2000:10",
+        seed=None,
+    ):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.app_limits = app_limits
+        self.method_limits = method_limits
+        self.random = random.Random(seed)
+        self.app_counters = {}
+        self.method_counters = {}
+        self.requests = {}
+        # the player whose history listed a match plays in it as participant 0
+        self.match_owners = {}
+        self.fixtures = {
+            name: load_fixture(name)
+            for name in (
+                "account",
+                "summoner",
+                "league_entries",
+                "champion_masteries",
+                "match",
+                "active_game",
+            )
+        }
+        self.now = int(time.time())
+
+    def create_app(self):
+        app = web.Application(middlewares=[self.middleware])
+        routes = [
+            (
+                "/{host}/riot/account/v1/accounts/by-riot-id/{name}/{tag}",
+                self.account_by_riot_id,
+            ),
+            ("/{host}/riot/account/v1/accounts/by-puuid/{puuid}", self.account),
+            ("/{host}/lol/summoner/v4/summoners/by-puuid/{puuid}", self.summoner),
+            ("/{host}/lol/league/v4/entries/by-puuid/{puuid}", self.league_entries),
+            (
+                "/{host}/lol/champion-mastery/v4/champion-masteries/by-puuid/{puuid}",
+                self.masteries,
+            ),
+            ("/{host}/lol/match/v5/matches/by-puuid/{puuid}/ids", self.match_ids),
+            ("/{host}/lol/match/v5/matches/{match_id}", self.match),
+            (
+                "/{host}/lol/spectator/v5/active-games/by-summoner/{puuid}",
+                self.active_game,
+            ),
+        ]
+        for path, handler in routes:
+            app.router.add_get(path, handler)
+        return app
+
+    @web.middleware
+    async def middleware(self, request, handler):
+        host = request.match_info.get("host", "")
+        resource = request.match_info.route.resource
+        method = resource.canonical if resource is not None else request.path
+        self.requests[method] = self.requests.get(method, 0) + 1
+        await asyncio.sleep(
+            max(self.latency + self.random.uniform(-self.jitter, self.jitter), 0)
+        )
+        now = time.monotonic()
+        app_counter = self.app_counters.setdefault(
+            host, RateLimitCounter(self.app_limits)
+        )
+        method_counter = self.method_counters.setdefault(
+            (host, method), RateLimitCounter(self.method_limits)
+        )
+        headers = {}
+        limit_type = None
+        if not app_counter.hit(now):
+            limit_type = "application"
+        elif not method_counter.hit(now):
+            limit_type = "method"
+        elif self.random.random() < self.throttle_rate:
+            limit_type = "service"
+        headers["X-App-Rate-Limit"] = app_counter.header()
+        headers["X-App-Rate-Limit-Count"] = app_counter.count_header()
+        headers["X-Method-Rate-Limit"] = method_counter.header()
+        headers["X-Method-Rate-Limit-Count"] = method_counter.count_header()
+        if limit_type is not None:
+            headers["X-Rate-Limit-Type"] = limit_type
+            headers["Retry-After"] = "1"
+            return web.json_response(
+                {"status": {"message": "Rate limit exceeded", "status_code": 429}},
+                status=429,
+                headers=headers,
+            )
+        if self.random.random() < self.error_rate:
+            status = self.random.choice((500, 502, 503, 504))
+            return web.Response(
+                text="<html><body>Service Unavailable</body></html>",
+                status=status,
+                content_type="text/html",
+                headers=headers,
+            )
+        response = await handler(request)
+        response.headers.update(headers)
+        return response
+
+    def respond(self, name, replacements):
+        body = self.fixtures[name]
+        for placeholder, value in replacements.items():
+            body = body.replace(placeholder.encode(), value.encode())
+        return web.Response(body=body, content_type="application/json")
+
+    def not_found(self, message):
+        return web.json_response(
+            {"status": {"message": message, "status_code": 404}}, status=404
+        )
+
+    def account_response(self, puuid, name, tag):
+        data = json.loads(
+            self.fixtures["account"].replace(b"__PUUID__", puuid.encode())
+        )
+        data["gameName"] = name
+        data["tagLine"] = tag
+        return web.json_response(data)
+
+    async def account_by_riot_id(self, request):
+        name = request.match_info["name"]
+        tag = request.match_info["tag"]
+        if name.lower().startswith("missing"):
+            return self.not_found("Data not found - No results found for player")
+        return self.account_response(f"{name}-{tag}".lower(), name, tag)
+
+    async def account(self, request):
+        puuid = request.match_info["puuid"]
+        name, _, tag = puuid.rpartition("-")
+        return self.account_response(puuid, name or puuid, tag or "EUNE")
+
+    async def summoner(self, request):
+        return self.respond("summoner", {"__PUUID__": request.match_info["puuid"]})
+
+    async def league_entries(self, request):
+        return self.respond(
+            "league_entries", {"__PUUID__": request.match_info["puuid"]}
+        )
+
+    async def masteries(self, request):
+        return self.respond(
+            "champion_masteries", {"__PUUID__": request.match_info["puuid"]}
+        )
+
+    async def match_ids(self, request):
+        puuid = request.match_info["puuid"]
+        start = int(request.query.get("start", 0))
+        count = min(int(request.query.get("count", 20)), 100)
+        start_time = int(request.query.get("startTime", 0))
+        total = MATCHES_PER_PLAYER
+        if start_time:
+            # match n started n * MATCH_SPACING seconds before the stub did
+            total = min(max((self.now - start_time) // MATCH_SPACING, 0), total)
+        end = min(start + count, total)
+        base = zlib.crc32(puuid.encode()) * MATCHES_PER_PLAYER
+        match_ids = [f"EUN1_{base + MATCHES_PER_PLAYER - i}" for i in range(start, end)]
+        for match_id in match_ids:
+            self.match_owners[match_id] = puuid
+        return web.json_response(match_ids)
+
+    async def match(self, request):
+        match_id = request.match_info["match_id"]
+        if not match_id.startswith("EUN1_"):
+            return self.not_found("Data not found - match file not found")
+        replacements = {"__MATCH_ID__": match_id}
+        for i in range(10):
+            replacements[f"__PUUID_{i}__"] = f"{match_id}-player-{i}"
+        if match_id in self.match_owners:
+            replacements["__PUUID_0__"] = self.match_owners[match_id]
+        return self.respond("match", replacements)
+
+    async def active_game(self, request):
+        puuid = request.match_info["puuid"]
+        # about a third of the players are never in a game
+        if zlib.crc32(puuid.encode()) % 3 == 0:
+            return self.not_found("Data not found - spectator game info isn't found")
+        body = self.fixtures["active_game"]
+        for i in range(1, 10):
+            body = body.replace(f"__PUUID_{i}__".encode(), f"{puuid}-ally-{i}".encode())
+        data = json.loads(body.replace(b"__PUUID_0__", puuid.encode()))
+        # every game started 10 minutes before the stub did
+        data["gameStartTime"] = (self.now - 600) * 1000
+        data["gameLength"] = int(time.time()) - self.now + 600
+        return web.json_response(data)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for the Riot API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--jitter", type=float, default=0.02)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    parser.add_argument("--app-limits", default="500:10,30000:600")
+    parser.add_argument("--method-limits", default="2000:10")
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+    stub = RiotStub(
+        args.latency,
+        args.jitter,
+        args.error_rate,
+        args.throttle_rate,
+        args.app_limits,
+        args.method_limits,
+        args.seed,
+    )
+    print(f"Riot stub listening on http://{args.host}:{args.port}/{{host}}/")
+    web.run_app(stub.create_app(), host=args.host, port=args.port, print=None)
+
+
+if __name__ == "__main__":
+    main()
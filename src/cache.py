@@ -0,0 +1,232 @@
+import asyncio
+import contextvars
+import functools
+import inspect
+import sys
+import time
+from collections import OrderedDict
+
+from logger import log
+
+MISSING = object()
+
+caches = {}
+
+# run in the context of background refreshes, e.g. to lower their priority
+background_hooks = []
+
+
+def estimate_size(value):
+    size = 0
+    seen = set()
+    stack = [value]
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen:
+            continue
+        seen.add(id(obj))
+        size += sys.getsizeof(obj)
+        if isinstance(obj, (str, bytes, int, float, bool)) or obj is None:
+            continue
+        if isinstance(obj, dict):
+            stack.extend(obj.keys())
+            stack.extend(obj.values())
+        elif isinstance(obj, (list, tuple, set, frozenset)):
+            stack.extend(obj)
+        else:
+            if hasattr(obj, "__dict__"):
+                stack.append(vars(obj))
+            for slot in getattr(type(obj), "__slots__", ()):
+                if hasattr(obj, slot):
+                    stack.append(getattr(obj, slot))
+    return size
+
+
+class LRUCache:
+    def __init__(self, name, ttl=60, max_bytes=1024 * 1024, stale_ttl=0):
+        self.name = name
+        self.ttl = ttl
+        # entries are kept this much longer than ttl and can be served stale
+        self.stale_ttl = stale_ttl
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        caches[name] = self
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, key):
+        return self.get(key, count=False) is not MISSING
+
+    def get(self, key, count=True):
+        entry = self.entries.get(key)
+        if entry is not None and entry[1] <= time.monotonic():
+            self._remove(key)
+            self.expirations += 1
+            entry = None
+        if entry is None:
+            if count:
+                self.misses += 1
+            return MISSING
+        self.entries.move_to_end(key)
+        if count:
+            self.hits += 1
+        return entry[0]
+
+    def get_stale(self, key):
+        # returns (value, stale), where stale values are past ttl but not stale_ttl
+        value = self.get(key)
+        if value is MISSING:
+            return MISSING, False
+        stale = self.entries[key][3] <= time.monotonic()
+        if stale:
+            self.stale_hits += 1
+        return value, stale
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        fresh_until = float("inf") if ttl == -1 else time.monotonic() + ttl
+        expires_at = fresh_until + self.stale_ttl
+        size = estimate_size(key) + estimate_size(value)
+        if key in self.entries:
+            self._remove(key)
+        if size > self.max_bytes:
+            log(
+                "Entry of %d bytes exceeds budget of %s cache, not caching",
+                "TRACE",
+                size,
+                self.name,
+            )
+            return
+        self.entries[key] = (value, expires_at, size, fresh_until)
+        self.size += size
+        while self.size > self.max_bytes:
+            self._remove(next(iter(self.entries)))
+            self.evictions += 1
+
+    def pop(self, key):
+        if key in self.entries:
+            self._remove(key)
+
+    def clear(self):
+        self.entries.clear()
+        self.size = 0
+
+    def sweep(self):
+        now = time.monotonic()
+        expired = [key for key, entry in self.entries.items() if entry[1] <= now]
+        for key in expired:
+            self._remove(key)
+        self.expirations += len(expired)
+        return len(expired)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "bytes": self.size,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+    def _remove(self, key):
+        self.size -= self.entries.pop(key)[2]
+
+
+def cache_stats():
+    return {name: cache.stats() for name, cache in caches.items()}
+
+
+async def sweep_caches(interval=60):
+    while True:
+        await asyncio.sleep(interval)
+        for cache in list(caches.values()):
+            expired = cache.sweep()
+            if expired:
+                log("Swept %d expired entries from %s", "TRACE", expired, cache.name)
+
+
+def default_key(func):
+    signature = inspect.signature(func)
+
+    def make_key(*args, **kwargs):
+        bound = signature.bind(*args, **kwargs)
+        bound.apply_defaults()
+        return tuple(value for name, value in bound.arguments.items() if name != "self")
+
+    return make_key
+
+
+def ttl_cache(ttl=60, max_bytes=1024 * 1024, key=None, stale_ttl=0):
+    def wrapper(func):
+        cache = LRUCache(func.__qualname__, ttl, max_bytes, stale_ttl)
+        make_key = key or default_key(func)
+        pending = {}
+
+        def store(cache_key, task):
+            del pending[cache_key]
+            if task.cancelled() or task.exception() is not None:
+                return
+            # None means not found or failed, which is cached closer to the request
+            if task.result() is None:
+                return
+            log("Caching result for %s with key: %s", "TRACE", cache.name, cache_key)
+            cache.set(cache_key, task.result())
+
+        def start(cache_key, args, kwargs, background=False):
+            # one shared task per key, so a cancelled caller doesn't cancel the rest
+            if background:
+                context = contextvars.copy_context()
+                for hook in background_hooks:
+                    context.run(hook)
+                task = asyncio.get_running_loop().create_task(
+                    func(*args, **kwargs), context=context
+                )
+            else:
+                task = asyncio.ensure_future(func(*args, **kwargs))
+            pending[cache_key] = task
+            task.add_done_callback(lambda task: store(cache_key, task))
+            return task
+
+        @functools.wraps(func)
+        async def wrapped(*args, **kwargs):
+            cache_key = make_key(*args, **kwargs)
+            value, stale = cache.get_stale(cache_key)
+            if value is not MISSING:
+                if stale and cache_key not in pending:
+                    log(
+                        "Serving stale %s with key: %s, refreshing in background",
+                        "TRACE",
+                        cache.name,
+                        cache_key,
+                    )
+                    start(cache_key, args, kwargs, background=True)
+                else:
+                    log("Cache hit for %s with key: %s", "TRACE", cache.name, cache_key)
+                return value
+            if cache_key in pending:
+                log(
+                    "Joining in-flight call for %s with key: %s",
+                    "TRACE",
+                    cache.name,
+                    cache_key,
+                )
+            else:
+                start(cache_key, args, kwargs)
+            return await asyncio.shield(pending[cache_key])
+
+        wrapped.cache = cache
+        return wrapped
+
+    return wrapper
@@ -0,0 +1,68 @@
+import time
+
+from logger import log
+from metrics import riot_circuit_opens
+
+
+class CircuitBreaker:
+    # closed until failure_threshold transient failures in a row, then open
+    # for reset_timeout, after which a single request may probe the host
+    def __init__(self, host, failure_threshold=5, reset_timeout=30):
+        self.host = host
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.probe_started = None
+
+    def __str__(self):
+        return f"CircuitBreaker(host={self.host}, failures={self.failures})"
+
+    def is_open(self):
+        return self.opened_at is not None
+
+    def retry_in(self):
+        if self.opened_at is None:
+            return 0.0
+        return max(self.opened_at + self.reset_timeout - time.monotonic(), 0.0)
+
+    def allow(self):
+        if self.opened_at is None:
+            return True
+        now = time.monotonic()
+        if now - self.opened_at < self.reset_timeout:
+            return False
+        # a probe that never reported back (e.g. cancelled) doesn't block forever
+        if (
+            self.probe_started is not None
+            and now - self.probe_started < self.reset_timeout
+        ):
+            return False
+        self.probe_started = now
+        return True
+
+    def record_success(self):
+        if self.opened_at is not None:
+            # requests sent before the circuit opened don't get to close it
+            if self.probe_started is None:
+                return
+            log(f"Circuit for {self.host} closed again", "INFO")
+        self.failures = 0
+        self.opened_at = None
+        self.probe_started = None
+
+    def record_failure(self):
+        if self.opened_at is not None and self.probe_started is None:
+            return
+        self.failures += 1
+        if self.probe_started is not None or (
+            self.opened_at is None and self.failures >= self.failure_threshold
+        ):
+            self.opened_at = time.monotonic()
+            self.probe_started = None
+            riot_circuit_opens.inc(self.host)
+            log(
+                f"Circuit for {self.host} opened after {self.failures} failures, "
+                f"failing fast for {self.reset_timeout}s",
+                "WARNING",
+            )
@@ -1,7 +1,13 @@
 import discord
 from datetime import datetime
-import requests
 import random
+import time
+
+from cache import LRUCache, MISSING
+from static_data import static_data
+
+# finished matches never change, so a rendered view of one is reused as is
+render_cache = LRUCache("RenderCache", ttl=24 * 3600, max_bytes=8 * 1024 * 1024)
 
 # big brain file hosting :)
 rank_assets = {
@@ -18,21 +24,24 @@ rank_assets = {
     "CHALLENGER": "https://cdn.discordapp.com/attachments/989905618494181386/989905731186749470/challenger.png",
 }
 
-league_patch = "14.3.1"
-
-champion_info = requests.get(
-    f"https://ddragon.leagueoflegends.com/cdn/{league_patch}/data/en_US/champion.json"
-).json()
-champion_name = {}
-for champion in champion_info["data"]:
-    champion_name[int(champion_info["data"][champion]["key"])] = champion
-
 
 def icon_url(icon_id):
-    return f"https://ddragon.leagueoflegends.com/cdn/{league_patch}/img/profileicon/{icon_id}.png"
+    return static_data.icon_url(icon_id)
 
 
 def generate_match_embed(game_info, puuid):
+    key = (game_info.id, puuid, "match")
+    cached = render_cache.get(key)
+    if cached is not MISSING:
+        return discord.Embed.from_dict(cached)
+    embed = render_match_embed(game_info, puuid)
+    # a match loaded without Riot IDs renders placeholders, don't pin those
+    if all(player.name is not None for player in game_info.participants):
+        render_cache.set(key, embed.to_dict())
+    return embed
+
+
+def render_match_embed(game_info, puuid):
     multikill_names = ["Doublekill", "Triplekill", "Quadrakill", "Pentakill"]
     blue_kills = 0
     red_kills = 0
@@ -81,7 +90,7 @@ def generate_match_embed(game_info, puuid):
             multikill = f"{multikill_names[max_multikill]} {'x' if count > 1 else ''}{count if count > 1 else ''}{':exclamation:' if max_multikill >= 2 else ''}"
         star = "\u2605" if player.damage == top_damage else ""
         embed.add_field(
-            name=f"{player.name} - {repair_champ_name(player.champion_name)} {player.kills}/{player.deaths}/{player.assists} {last_char} {multikill}",
+            name=f"{player.name} - {static_data.champion_name(player.champion_id, player.champion_name)} {player.kills}/{player.deaths}/{player.assists} {last_char} {multikill}",
             value=f"KDA: **{player.kda()}**, CS: **{player.creep_score}** ({round(float(player.creep_score)/(float(game_info.duration)/60.0), 2)}), {star}DMG: **{player.damage}**, GOLD: **{player.gold}**",
             inline=False,
         )
@@ -117,13 +126,15 @@ def generate_user_embed(user_info):
     )
     embed.add_field(
         name=f"Total Mastery: {user_info.total_mastery}",
-        value=f" Total Points: {user_info.total_points:,}",
+        value=(
+            f" Total Points: {user_info.total_points:,}"
+            if user_info.total_points is not None
+            else ""
+        ),
         inline=False,
     )
     for champion in user_info.top_champs[:3]:
-        name = f"ID: {champion[0]}"
-        if champion[0] in champion_name:
-            name = repair_champ_name(champion_name[champion[0]])
+        name = static_data.champion_name(champion[0]) or f"ID: {champion[0]}"
         embed.add_field(
             name=f"{name} ({champion[1]} lvl)", value=f"{champion[2]:,} pts."
         )
@@ -131,35 +142,142 @@ def generate_user_embed(user_info):
     return embed
 
 
-def generate_history_embed(match_history, nametag):
+def generate_history_embed(match_history, nametag, total=None, color=None):
+    loaded = len(match_history[0])
     embed = discord.Embed(
-        title=f"Last {len(match_history[0])} Games",
+        title=f"Last {total or loaded} Games",
         description=f"",
-        color=random.randint(0, 16777215),
+        color=random.randint(0, 16777215) if color is None else color,
     )
     embed.set_author(
         name=f"{nametag} ({match_history[1]['summonerLevel']} lvl)",
         icon_url=icon_url(match_history[1]["profileIconId"]),
     )
-    for i in range(len(match_history[0])):
-        match = match_history[0][i]
-        for participant in match.participants:
-            if participant.puuid == match_history[1]["puuid"]:
-                m, s = divmod(match.duration, 60)
-                result_emoji = (
-                    ":white_circle:"
-                    if match.duration < 300
-                    else (
-                        ":blue_circle:"
-                        if match.winner == participant.team
-                        else ":red_circle:"
-                    )
+    puuid = match_history[1]["puuid"]
+    for i, match in enumerate(match_history[0]):
+        key = (match.id, puuid, "history")
+        row = render_cache.get(key)
+        if row is MISSING:
+            row = render_history_row(match, puuid)
+            render_cache.set(key, row)
+        if row is not None:
+            result_emoji, name, value = row
+            embed.add_field(
+                name=f"{result_emoji} {i+1} - {name}", value=value, inline=False
+            )
+    if total is not None and loaded < total:
+        embed.set_footer(text=f"Loading games... {loaded}/{total}")
+    return embed
+
+
+def render_history_row(match, puuid):
+    for participant in match.participants:
+        if participant.puuid == puuid:
+            m, s = divmod(match.duration, 60)
+            result_emoji = (
+                ":white_circle:"
+                if match.duration < 300
+                else (
+                    ":blue_circle:"
+                    if match.winner == participant.team
+                    else ":red_circle:"
                 )
-                embed.add_field(
-                    name=f"{result_emoji} {i+1} - {match.queue_type} - {repair_champ_name(participant.champion_name)} {participant.kills}/{participant.deaths}/{participant.assists} - {m:02d}:{s:02d}",
-                    value=f"KDA: **{participant.kda()}**, CS: **{participant.creep_score}** ({round(float(participant.creep_score)/(float(match.duration)/60.0), 2)}), DMG: **{participant.damage}**, GOLD: **{participant.gold}**",
-                    inline=False,
+            )
+            return (
+                result_emoji,
+                f"{match.queue_type} - {static_data.champion_name(participant.champion_id, participant.champion_name)} {participant.kills}/{participant.deaths}/{participant.assists} - {m:02d}:{s:02d}",
+                f"KDA: **{participant.kda()}**, CS: **{participant.creep_score}** ({round(float(participant.creep_score)/(float(match.duration)/60.0), 2)}), DMG: **{participant.damage}**, GOLD: **{participant.gold}**",
+            )
+    return None
+
+
+def average_kda(stats):
+    if stats["deaths"] == 0:
+        return "Perfect"
+    return str(round((stats["kills"] + stats["assists"]) / stats["deaths"], 2))
+
+
+def generate_stats_embed(stats, nametag, queue_name="All queues"):
+    games = stats["games"]
+    minutes = stats["duration"] / 60
+    embed = discord.Embed(
+        title=f"Last {games} Games - {queue_name}",
+        description=f"Winrate: **{round(stats['win'] / games * 100, 2)}%** ({stats['win']}W {games - stats['win']}L), KDA: **{average_kda(stats)}**, CS/min: **{round(stats['creep_score'] / minutes, 2)}**, DMG/min: **{round(stats['damage'] / minutes)}**",
+        color=random.randint(0, 16777215),
+    )
+    embed.set_author(name=str(nametag))
+    for champion in stats["champions"][:10]:
+        name = static_data.champion_name(champion["champion_id"]) or (
+            f"ID: {champion['champion_id']}"
+        )
+        played = champion["games"]
+        minutes = champion["duration"] / 60
+        embed.add_field(
+            name=f"{name} - {played} games, {round(champion['win'] / played * 100, 2)}% WR",
+            value=f"KDA: **{average_kda(champion)}** ({round(champion['kills'] / played, 1)}/{round(champion['deaths'] / played, 1)}/{round(champion['assists'] / played, 1)}), CS/min: **{round(champion['creep_score'] / minutes, 2)}**, DMG/min: **{round(champion['damage'] / minutes)}**",
+            inline=False,
+        )
+    return embed
+
+
+def generate_leaderboard_embed(ranking, guild_name, limit=25):
+    lines = []
+    for i, player in enumerate(ranking[:limit]):
+        if player.tier == "UNRANKED":
+            rank = "Unranked"
+        elif player.tier in ("MASTER", "GRANDMASTER", "CHALLENGER"):
+            rank = f"{player.tier} {player.lp} LP"
+        else:
+            rank = f"{player.tier} {player.division} {player.lp} LP"
+        games = (
+            f" ({player.wins}W {player.losses}L)" if player.wins + player.losses else ""
+        )
+        lines.append(f"**{i+1}.** {player.name} - {rank}{games}")
+    embed = discord.Embed(
+        title=f"{guild_name} Solo/Duo Leaderboard",
+        description="\n".join(lines),
+        color=random.randint(0, 16777215),
+    )
+    embed.set_thumbnail(url=rank_assets[ranking[0].tier.upper()])
+    if len(ranking) > limit:
+        embed.set_footer(text=f"and {len(ranking) - limit} more players")
+    return embed
+
+
+def generate_live_embed(game, nametag, puuid, final=False):
+    if game is None:
+        embed = discord.Embed(
+            title=f"{nametag} is not in game",
+            description="" if final else "Waiting for a game to start...",
+            color=0xAFAEAE,
+        )
+    else:
+        if game.start_time:
+            m, s = divmod(max(int(time.time() - game.start_time / 1000), 0), 60)
+            length = f"{m:02d}:{s:02d}"
+        else:
+            length = "Loading"
+        embed = discord.Embed(
+            title=f"{nametag} is in game",
+            description=f"Type: **{game.queue_type}**, Time: **{length}**",
+            color=0x53A8E8,
+        )
+        for team, circle in (("Blue", ":blue_circle:"), ("Red", ":red_circle:")):
+            lines = []
+            for player in game.participants:
+                if player.team != team:
+                    continue
+                heart = " :green_heart:" if player.puuid == puuid else ""
+                name = player.name if player.name is not None else "Bot"
+                champion = (
+                    static_data.champion_name(player.champion_id)
+                    or f"ID: {player.champion_id}"
                 )
+                lines.append(f"**{champion}** - {name}{heart}")
+            embed.add_field(
+                name=f"{circle} {team} Team", value="\n".join(lines), inline=False
+            )
+    embed.set_footer(text="No longer updating" if final else "Updating live")
     return embed
 
 
@@ -183,6 +301,22 @@ def generate_help_embed(server_names, default_server):
             "name": "/history {name} {tag} {count?} {server?}",
             "value": "Check last 1-20 games of a player, default 5",
         },
+        {
+            "name": "/stats {name} {tag} {count?} {queue?}",
+            "value": "Winrate and KDA per champion over the last 1-100 games, default 100",
+        },
+        {
+            "name": "/live {name} {tag} {server?}",
+            "value": "Follow the game a player is in right now, updated until it ends",
+        },
+        {
+            "name": "/register {name} {tag} {server?}",
+            "value": "Add a player to this server's leaderboard, /unregister removes them",
+        },
+        {
+            "name": "/leaderboard",
+            "value": "Rank this server's registered players by Solo/Duo tier and LP",
+        },
         {"name": "", "value": ""},
         {
             "name": f"Avaiable game servers (default is {default_server})",
@@ -193,13 +327,3 @@ def generate_help_embed(server_names, default_server):
     for data in help_data:
         embed.add_field(name=data["name"], value=data["value"], inline=False)
     return embed
-
-
-def repair_champ_name(champ_name):
-    new_champ_name = ""
-    for i in champ_name:
-        if i <= "Z" and new_champ_name != "":
-            new_champ_name += " " + i
-        else:
-            new_champ_name += i
-    return new_champ_name
@@ -1,7 +1,7 @@
 from dataclasses import dataclass
 
 
-@dataclass
+@dataclass(slots=True)
 class NameTag:
     name: str
     tag: str
@@ -10,7 +10,7 @@ class NameTag:
         return f"{self.name}#{self.tag}"
 
 
-@dataclass
+@dataclass(slots=True)
 class GameInfo:
     id: int
     start_time: int
@@ -18,9 +18,10 @@ class GameInfo:
     winner: str
     participants: list
     queue_type: str
+    queue_id: int
 
 
-@dataclass
+@dataclass(slots=True)
 class PlayerInfo:
     puuid: str
     name: NameTag
@@ -34,7 +35,7 @@ class PlayerInfo:
     creep_score: int
     vision_score: int
     team: str
-    multikills: int
+    multikills: tuple
     position: str
 
     def kda(self):
@@ -43,7 +44,7 @@ class PlayerInfo:
         return str(round((self.kills + self.assists) / self.deaths, 2))
 
 
-@dataclass
+@dataclass(slots=True)
 class UserInfo:
     puuid: str
     name: NameTag
@@ -61,3 +62,34 @@ class UserInfo:
     top_champs: list
     total_points: int
     total_mastery: int
+
+
+@dataclass(slots=True)
+class RankedPlayer:
+    puuid: str
+    server: str
+    name: NameTag
+    tier: str
+    division: str
+    lp: int
+    wins: int
+    losses: int
+    refreshed_at: float
+
+
+@dataclass(slots=True)
+class LivePlayer:
+    puuid: str
+    name: NameTag
+    champion_id: int
+    team: str
+
+
+@dataclass(slots=True)
+class LiveGame:
+    id: int
+    # 0 while players are still loading in
+    start_time: int
+    queue_type: str
+    queue_id: int
+    participants: list
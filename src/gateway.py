@@ -0,0 +1,272 @@
+import asyncio
+import functools
+import itertools
+import os
+import struct
+
+import msgpack
+
+from game_info import NameTag, GameInfo, PlayerInfo, UserInfo, LiveGame, LivePlayer
+from logger import log
+from rate_limiter import request_priority
+from riot_api import RiotAPI, RiotUnavailableError
+
+HEADER = struct.Struct(">I")
+MAX_FRAME = 64 * 1024 * 1024
+
+# results are sent as msgpack ext types so shards get the same objects back
+EXT_TYPES = {
+    1: NameTag,
+    2: PlayerInfo,
+    3: GameInfo,
+    4: UserInfo,
+    5: LiveGame,
+    6: LivePlayer,
+}
+EXT_CODES = {cls: code for code, cls in EXT_TYPES.items()}
+
+# RiotAPI coroutines a shard is allowed to call through the gateway
+METHODS = {
+    "get_riot_account_puuid",
+    "get_riot_nametag_by_puuid",
+    "get_summoner_by_puuid",
+    "get_matches_ids_by_puuid",
+    "get_ranked_info",
+    "get_mastery_info",
+    "get_mastery_summary",
+    "get_recent_matches_ids",
+    "get_match_info_by_id",
+    "get_recent_matches_infos",
+    "get_recent_match_info",
+    "get_profile_info",
+    "get_player_stats",
+    "get_active_game",
+}
+
+
+class GatewayError(Exception):
+    pass
+
+
+def encode_ext(obj):
+    code = EXT_CODES.get(type(obj))
+    if code is None:
+        raise TypeError(f"Cannot send {type(obj).__name__} through the gateway")
+    fields = [getattr(obj, name) for name in obj.__slots__]
+    return msgpack.ExtType(code, msgpack.packb(fields, default=encode_ext))
+
+
+def decode_ext(code, data):
+    cls = EXT_TYPES.get(code)
+    if cls is None:
+        return msgpack.ExtType(code, data)
+    return cls(*msgpack.unpackb(data, ext_hook=decode_ext, strict_map_key=False))
+
+
+def pack(message):
+    payload = msgpack.packb(message, default=encode_ext)
+    return HEADER.pack(len(payload)) + payload
+
+
+async def read_frame(reader):
+    header = await reader.readexactly(HEADER.size)
+    (size,) = HEADER.unpack(header)
+    if size > MAX_FRAME:
+        raise GatewayError(f"Frame of {size} bytes is too large")
+    payload = await reader.readexactly(size)
+    return msgpack.unpackb(payload, ext_hook=decode_ext, strict_map_key=False)
+
+
+class RiotGateway:
+    def __init__(self, riot_client, path):
+        self.riot_client = riot_client
+        self.path = path
+        self.server = None
+        self.connections = {}
+
+    async def start(self):
+        if os.path.exists(self.path):
+            # left behind by a previous run, nothing can be listening on it
+            os.unlink(self.path)
+        self.server = await asyncio.start_unix_server(self.handle_connection, self.path)
+        log(f"Riot gateway listening on {self.path}")
+
+    async def close(self):
+        if self.server is None:
+            return
+        self.server.close()
+        # closing the sockets lets every handler finish through its own EOF path
+        for writer in self.connections.values():
+            writer.close()
+        await asyncio.gather(*self.connections, return_exceptions=True)
+        await self.server.wait_closed()
+        self.server = None
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+    async def handle_connection(self, reader, writer):
+        connection = asyncio.current_task()
+        self.connections[connection] = writer
+        tasks = set()
+        log("Shard connected to the Riot gateway", "DEBUG")
+        try:
+            while True:
+                request_id, method, args, kwargs, priority = await read_frame(reader)
+                task = asyncio.create_task(
+                    self.handle_request(
+                        writer, request_id, method, args, kwargs, priority
+                    )
+                )
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        except (GatewayError, msgpack.UnpackException, ValueError, TypeError) as e:
+            # a frame we can't read leaves the stream out of sync, so drop it
+            log(f"Dropping shard connection: {e!r}", "WARNING")
+        finally:
+            for task in list(tasks):
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            writer.close()
+            self.connections.pop(connection, None)
+            log("Shard disconnected from the Riot gateway", "DEBUG")
+
+    async def handle_request(self, writer, request_id, method, args, kwargs, priority):
+        # each request runs in its own task, so this only affects this call
+        request_priority.set(priority)
+        try:
+            if method not in METHODS:
+                raise GatewayError(f"Unknown gateway method {method}")
+            result = await getattr(self.riot_client, method)(*args, **kwargs)
+            response = [request_id, True, result]
+        except asyncio.CancelledError:
+            raise
+        except RiotUnavailableError as e:
+            # shards tell outages apart from bugs, so keep the type
+            response = [request_id, False, [e.host, e.reason]]
+        except Exception as e:
+            log(f"Gateway call {method} failed: {e!r}", "ERROR")
+            response = [request_id, False, f"{type(e).__name__}: {e}"]
+        response.append(self.riot_client.rate_limiter.headroom(self.riot_client.region))
+        if writer.is_closing():
+            return
+        writer.write(pack(response))
+        try:
+            await writer.drain()
+        except ConnectionError:
+            pass
+
+
+class GatewayRateLimit:
+    # shards only see the headroom the gateway reported with its last response
+    def __init__(self):
+        self.last_headroom = 1.0
+
+    def headroom(self, host):
+        return self.last_headroom
+
+
+class RiotGatewayClient:
+    queue_weight = RiotAPI.queue_weight
+    server_names = RiotAPI.server_names
+
+    def __init__(self, path, region, timeout=60, connect_timeout=5):
+        self.path = path
+        self.region = region.upper()
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.rate_limiter = GatewayRateLimit()
+        self.reader = None
+        self.writer = None
+        self.receiver = None
+        self.pending = {}
+        self.counter = itertools.count()
+        self.connect_lock = asyncio.Lock()
+
+    def __str__(self):
+        return f"RiotGatewayClient(path={self.path}, region={self.region})"
+
+    def __repr__(self):
+        return str(self)
+
+    def __getattr__(self, name):
+        if name in METHODS:
+            return functools.partial(self.call, name)
+        raise AttributeError(name)
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def start(self):
+        async with self.connect_lock:
+            if self.writer is not None and not self.writer.is_closing():
+                return
+            self.reader, self.writer = await asyncio.wait_for(
+                asyncio.open_unix_connection(self.path), self.connect_timeout
+            )
+            self.receiver = asyncio.create_task(self.receive(self.reader))
+            log(f"Connected to the Riot gateway at {self.path}", "DEBUG")
+
+    async def close(self):
+        if self.receiver is not None:
+            self.receiver.cancel()
+            await asyncio.gather(self.receiver, return_exceptions=True)
+            self.receiver = None
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+        self.fail_pending(ConnectionError("Riot gateway client closed"))
+
+    def fail_pending(self, error):
+        pending, self.pending = self.pending, {}
+        for future in pending.values():
+            if not future.done():
+                future.set_exception(error)
+
+    async def receive(self, reader):
+        try:
+            while True:
+                request_id, ok, result, headroom = await read_frame(reader)
+                self.rate_limiter.last_headroom = headroom
+                future = self.pending.pop(request_id, None)
+                if future is None or future.done():
+                    continue
+                if ok:
+                    future.set_result(result)
+                elif isinstance(result, list):
+                    future.set_exception(RiotUnavailableError(*result))
+                else:
+                    future.set_exception(GatewayError(result))
+        except (
+            asyncio.IncompleteReadError,
+            ConnectionError,
+            GatewayError,
+            msgpack.UnpackException,
+            ValueError,
+            TypeError,
+        ) as e:
+            log(f"Lost connection to the Riot gateway: {e!r}", "WARNING")
+            if self.writer is not None:
+                self.writer.close()
+                self.writer = None
+            self.fail_pending(ConnectionError("Lost connection to the Riot gateway"))
+
+    async def call(self, method, *args, **kwargs):
+        if self.writer is None or self.writer.is_closing():
+            await self.start()
+        request_id = next(self.counter)
+        future = asyncio.get_running_loop().create_future()
+        self.pending[request_id] = future
+        self.writer.write(
+            pack([request_id, method, args, kwargs, request_priority.get()])
+        )
+        try:
+            await self.writer.drain()
+            return await asyncio.wait_for(future, self.timeout)
+        finally:
+            self.pending.pop(request_id, None)
@@ -0,0 +1,288 @@
+import asyncio
+import time
+
+from game_info import NameTag, RankedPlayer
+from logger import log
+from rate_limiter import run_in_background
+from sqlite_store import SQLiteStore
+
+# index i upgrades the schema from version i to i + 1
+MIGRATIONS = [
+    [
+        """CREATE TABLE players (
+            puuid TEXT PRIMARY KEY,
+            server TEXT NOT NULL,
+            name TEXT NOT NULL,
+            tag TEXT NOT NULL,
+            tier TEXT NOT NULL,
+            division TEXT NOT NULL,
+            lp INTEGER NOT NULL,
+            wins INTEGER NOT NULL,
+            losses INTEGER NOT NULL,
+            refreshed_at REAL NOT NULL
+        )""",
+        """CREATE TABLE members (
+            guild_id INTEGER NOT NULL,
+            puuid TEXT NOT NULL,
+            PRIMARY KEY (guild_id, puuid)
+        )""",
+    ],
+]
+
+SOLO_QUEUE = "RANKED_SOLO_5x5"
+DIVISIONS = {"IV": 0, "III": 1, "II": 2, "I": 3}
+
+
+def player_row(player):
+    return (
+        player.puuid,
+        player.server,
+        player.name.name,
+        player.name.tag,
+        player.tier,
+        player.division,
+        player.lp,
+        player.wins,
+        player.losses,
+        player.refreshed_at,
+    )
+
+
+class RosterStore(SQLiteStore):
+    # unlike the match store this is user data, so a newer schema is never dropped
+    def __init__(self, path):
+        super().__init__(path, MIGRATIONS)
+
+    def __str__(self):
+        return f"RosterStore(path={self.path})"
+
+    async def load(self):
+        return await asyncio.to_thread(self._load)
+
+    async def save_players(self, players):
+        await self.run(f"save {len(players)} players to", self._save_players, players)
+
+    async def add_member(self, guild_id, player):
+        await self.run(f"add {player.name} to", self._add_member, guild_id, player)
+
+    async def remove_member(self, guild_id, puuid):
+        await self.run(f"remove {puuid} from", self._remove_member, guild_id, puuid)
+
+    def _load(self):
+        with self.lock:
+            players = [
+                RankedPlayer(puuid, server, NameTag(name, tag), *rest)
+                for puuid, server, name, tag, *rest in self.connection.execute(
+                    "SELECT * FROM players"
+                )
+            ]
+            members = self.connection.execute(
+                "SELECT guild_id, puuid FROM members"
+            ).fetchall()
+        return players, members
+
+    def _save_players(self, players):
+        # an update never brings back a player that was unregistered meanwhile,
+        # here or by another shard
+        with self.lock, self.connection:
+            self.connection.executemany(
+                "UPDATE players SET server = ?, name = ?, tag = ?, tier = ?, "
+                "division = ?, lp = ?, wins = ?, losses = ?, refreshed_at = ? "
+                "WHERE puuid = ?",
+                [player_row(player)[1:] + (player.puuid,) for player in players],
+            )
+
+    def _add_member(self, guild_id, player):
+        with self.lock, self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO players VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                player_row(player),
+            )
+            self.connection.execute(
+                "INSERT OR IGNORE INTO members VALUES (?, ?)", (guild_id, player.puuid)
+            )
+
+    def _remove_member(self, guild_id, puuid):
+        with self.lock, self.connection:
+            self.connection.execute(
+                "DELETE FROM members WHERE guild_id = ? AND puuid = ?",
+                (guild_id, puuid),
+            )
+            self.connection.execute(
+                "DELETE FROM players WHERE puuid = ? AND puuid NOT IN "
+                "(SELECT puuid FROM members)",
+                (puuid,),
+            )
+
+
+class Leaderboard:
+    def __init__(
+        self,
+        riot_client,
+        store,
+        refresh_interval=1800,
+        max_members=200,
+        concurrency=8,
+        batch_size=50,
+        min_headroom=0.3,
+        tick=60,
+        owns_guild=None,
+    ):
+        self.riot_client = riot_client
+        self.store = store
+        self.refresh_interval = refresh_interval
+        self.max_members = max_members
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.min_headroom = min_headroom
+        self.tick = tick
+        # with several shard processes each one only keeps its own guilds
+        self.owns_guild = owns_guild
+        # every PUUID is stored and refreshed once, however many guilds list it
+        self.players = {}
+        self.guilds = {}
+        self.memberships = {}
+        # sorted per guild, dropped whenever one of its members changes
+        self.rankings = {}
+        self.refresher = None
+
+    def __str__(self):
+        return f"Leaderboard(players={len(self.players)}, guilds={len(self.guilds)})"
+
+    async def start(self):
+        await self.store.open()
+        players, members = await self.store.load()
+        players = {player.puuid: player for player in players}
+        for guild_id, puuid in members:
+            if self.owns_guild is not None and not self.owns_guild(guild_id):
+                continue
+            if puuid in players:
+                self.add_membership(guild_id, puuid)
+        self.players = {puuid: players[puuid] for puuid in self.memberships}
+        self.refresher = run_in_background(self.refresh_loop())
+        log(f"Loaded {self}", "DEBUG")
+
+    async def close(self):
+        if self.refresher is not None:
+            self.refresher.cancel()
+            await asyncio.gather(self.refresher, return_exceptions=True)
+            self.refresher = None
+        await self.store.close()
+
+    def score(self, player):
+        return (
+            self.riot_client.queue_weight.get(player.tier, -1),
+            DIVISIONS.get(player.division, 0),
+            player.lp,
+            player.wins,
+        )
+
+    def ranking(self, guild_id):
+        ranking = self.rankings.get(guild_id)
+        if ranking is None:
+            members = (self.players[puuid] for puuid in self.guilds.get(guild_id, ()))
+            ranking = sorted(members, key=self.score, reverse=True)
+            self.rankings[guild_id] = ranking
+        return ranking
+
+    def is_full(self, guild_id):
+        return len(self.guilds.get(guild_id, ())) >= self.max_members
+
+    def is_member(self, guild_id, puuid):
+        return puuid in self.guilds.get(guild_id, ())
+
+    def add_membership(self, guild_id, puuid):
+        self.guilds.setdefault(guild_id, set()).add(puuid)
+        self.memberships.setdefault(puuid, set()).add(guild_id)
+        self.rankings.pop(guild_id, None)
+
+    def invalidate(self, puuid):
+        for guild_id in self.memberships.get(puuid, ()):
+            self.rankings.pop(guild_id, None)
+
+    async def register(self, guild_id, puuid, server):
+        player = self.players.get(puuid)
+        if player is None or player.server != server:
+            # an account without a summoner on this server would show as unranked
+            summoner = await self.riot_client.get_summoner_by_puuid(puuid, server)
+            if summoner is None:
+                return None
+            player = RankedPlayer(puuid, server, None, "UNRANKED", "", 0, 0, 0, 0.0)
+            if not await self.refresh_player(player):
+                return None
+            self.players[puuid] = player
+            self.invalidate(puuid)
+        self.add_membership(guild_id, puuid)
+        await self.store.add_member(guild_id, player)
+        return player
+
+    async def unregister(self, guild_id, puuid):
+        if not self.is_member(guild_id, puuid):
+            return False
+        self.guilds[guild_id].discard(puuid)
+        self.memberships[puuid].discard(guild_id)
+        self.rankings.pop(guild_id, None)
+        if not self.memberships[puuid]:
+            del self.memberships[puuid]
+            del self.players[puuid]
+        await self.store.remove_member(guild_id, puuid)
+        return True
+
+    async def refresh_player(self, player):
+        ranks, name = await asyncio.gather(
+            self.riot_client.get_ranked_info(player.puuid, player.server),
+            self.riot_client.get_riot_nametag_by_puuid(player.puuid),
+        )
+        # keep the last known rank rather than replacing it with unranked
+        if name is None or ranks is None:
+            return False
+        before = self.score(player)
+        player.name = name
+        player.tier, player.division, player.lp = "UNRANKED", "", 0
+        player.wins, player.losses = 0, 0
+        for rank in ranks:
+            if rank[0] == SOLO_QUEUE:
+                player.tier, player.division, player.lp = rank[1], rank[2], rank[3]
+                player.wins, player.losses = rank[4], rank[5]
+        player.refreshed_at = time.time()
+        if self.score(player) != before:
+            self.invalidate(player.puuid)
+        return True
+
+    async def refresh_loop(self):
+        while True:
+            await asyncio.sleep(self.tick)
+            try:
+                await self.refresh_stale()
+            except Exception as e:
+                log(f"Leaderboard refresh failed: {e!r}", "ERROR")
+
+    async def refresh_stale(self):
+        deadline = time.time() - self.refresh_interval
+        stale = [p for p in self.players.values() if p.refreshed_at <= deadline]
+        if not stale:
+            return
+        stale.sort(key=lambda player: player.refreshed_at)
+        semaphore = asyncio.Semaphore(self.concurrency)
+        refreshed = []
+
+        async def refresh(player):
+            async with semaphore:
+                headroom = self.riot_client.rate_limiter.headroom(player.server)
+                if headroom < self.min_headroom:
+                    return
+                try:
+                    if await self.refresh_player(player):
+                        refreshed.append(player)
+                except Exception as e:
+                    log(f"Failed to refresh {player.name}: {e!r}", "WARNING")
+
+        await asyncio.gather(*(refresh(player) for player in stale[: self.batch_size]))
+        if refreshed:
+            await self.store.save_players(refreshed)
+        log(
+            "Refreshed %d of %d stale leaderboard players",
+            "DEBUG",
+            len(refreshed),
+            len(stale),
+        )
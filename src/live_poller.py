@@ -0,0 +1,185 @@
+import asyncio
+import random
+import time
+
+from logger import log
+from rate_limiter import run_in_background
+
+
+class LivePoll:
+    __slots__ = (
+        "puuid",
+        "server",
+        "subscribers",
+        "game",
+        "error",
+        "loaded",
+        "idle_polls",
+        "task",
+    )
+
+    def __init__(self, puuid, server):
+        self.puuid = puuid
+        self.server = server
+        # callback -> time.monotonic() after which it stops getting updates
+        self.subscribers = {}
+        self.game = None
+        self.error = None
+        self.loaded = asyncio.Event()
+        self.idle_polls = 0
+        self.task = None
+
+
+class LiveGamePoller:
+    def __init__(
+        self,
+        riot_client,
+        game_interval=60,
+        idle_interval=60,
+        max_idle_interval=300,
+        watch_time=3600,
+        max_players=100,
+        min_headroom=0.3,
+    ):
+        self.riot_client = riot_client
+        self.game_interval = game_interval
+        self.idle_interval = idle_interval
+        self.max_idle_interval = max_idle_interval
+        self.watch_time = watch_time
+        self.max_players = max_players
+        self.min_headroom = min_headroom
+        # one poll per (puuid, server), however many messages show it
+        self.polls = {}
+        self.tasks = set()
+        self.requests = 0
+        self.updates = 0
+
+    def __str__(self):
+        return f"LiveGamePoller(players={len(self.polls)})"
+
+    def is_full(self, puuid, server):
+        return (puuid, server) not in self.polls and len(self.polls) >= self.max_players
+
+    async def subscribe(self, puuid, server, callback):
+        # returns the current LiveGame or None, later polls are passed to
+        # callback(game, final) until the game ends or watch_time runs out
+        key = (puuid, server)
+        poll = self.polls.get(key)
+        if poll is None:
+            poll = LivePoll(puuid, server)
+            self.polls[key] = poll
+            poll.task = asyncio.create_task(self.run(key, poll))
+            self.tasks.add(poll.task)
+            poll.task.add_done_callback(self.tasks.discard)
+        poll.subscribers[callback] = time.monotonic() + self.watch_time
+        await poll.loaded.wait()
+        if poll.error is not None:
+            poll.subscribers.pop(callback, None)
+            raise poll.error
+        return poll.game
+
+    def unsubscribe(self, puuid, server, callback):
+        key = (puuid, server)
+        poll = self.polls.get(key)
+        if poll is None:
+            return
+        poll.subscribers.pop(callback, None)
+        # free the player's slot now rather than on the next tick
+        if not poll.subscribers:
+            del self.polls[key]
+            poll.task.cancel()
+
+    async def run(self, key, poll):
+        try:
+            # the first request is the one a command waits for, so it keeps
+            # the caller's priority
+            try:
+                poll.game = await self.fetch(poll)
+            except Exception as e:
+                poll.error = e
+                return
+            finally:
+                poll.loaded.set()
+            # nobody waits on the later polls, cancelling run cancels them too
+            await run_in_background(self.follow(poll))
+        finally:
+            if self.polls.get(key) is poll:
+                del self.polls[key]
+
+    async def follow(self, poll):
+        while poll.subscribers:
+            await asyncio.sleep(self.interval(poll))
+            await self.tick(poll)
+
+    def interval(self, poll):
+        if poll.game is not None:
+            interval = self.game_interval
+        else:
+            # the longer a player stays out of game, the less often we check
+            backoff = self.idle_interval * 2 ** min(poll.idle_polls, 8)
+            interval = min(backoff, self.max_idle_interval)
+        # spread out polls of players that were looked up at the same time
+        return interval * random.uniform(0.9, 1.1)
+
+    async def fetch(self, poll):
+        self.requests += 1
+        return await self.riot_client.get_active_game(poll.puuid, poll.server)
+
+    async def tick(self, poll):
+        now = time.monotonic()
+        expired = [
+            callback for callback, until in poll.subscribers.items() if until <= now
+        ]
+        for callback in expired:
+            del poll.subscribers[callback]
+        if expired:
+            await self.fan_out(poll, expired, True)
+        if not poll.subscribers:
+            return
+        headroom = self.riot_client.rate_limiter.headroom(poll.server)
+        if headroom < self.min_headroom:
+            log(
+                "Skipping live poll of %s, rate limit headroom %.2f",
+                "DEBUG",
+                poll.puuid,
+                headroom,
+            )
+            return
+        try:
+            game = await self.fetch(poll)
+        except Exception as e:
+            log(f"Live poll of {poll.puuid} failed: {e!r}", "WARNING")
+            return
+        ended = poll.game is not None and game is None
+        poll.game = game
+        poll.idle_polls = 0 if game is not None else poll.idle_polls + 1
+        callbacks = list(poll.subscribers)
+        if ended:
+            poll.subscribers.clear()
+        await self.fan_out(poll, callbacks, ended)
+
+    async def fan_out(self, poll, callbacks, final):
+        results = await asyncio.gather(
+            *(callback(poll.game, final) for callback in callbacks),
+            return_exceptions=True,
+        )
+        for callback, result in zip(callbacks, results):
+            if isinstance(result, Exception):
+                # usually a deleted message, nobody is looking at it anymore
+                log(f"Dropping live subscriber of {poll.puuid}: {result!r}", "DEBUG")
+                poll.subscribers.pop(callback, None)
+            else:
+                self.updates += 1
+
+    def stats(self):
+        return {
+            "players": len(self.polls),
+            "subscribers": sum(len(poll.subscribers) for poll in self.polls.values()),
+            "requests": self.requests,
+            "updates": self.updates,
+        }
+
+    async def close(self):
+        for task in list(self.tasks):
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
@@ -1,18 +1,106 @@
+import atexit
+import json
+import queue
+import sys
+import threading
+import time
 from datetime import datetime
 
+LEVELS = {"TRACE": 5, "DEBUG": 10, "INFO": 20, "WARNING": 30, "ERROR": 40}
+COLORS = {
+    "WARNING": "\033[93m",
+    "ERROR": "\033[91m",
+    "DEBUG": "\033[94m",
+    "INFO": "\033[92m",
+    "TRACE": "\033[90m",
+}
 
-def log(message, level="INFO"):
-    timestamp = datetime.now()
-    timestamp_str = timestamp.strftime("%Y-%m-%d %H:%M:%S")
-
-    message = f"{timestamp_str} {level}\t{message}"
-    if level == "WARNING":
-        print(f"\033[93m{message}\033[0m")
-    elif level == "ERROR":
-        print(f"\033[91m{message}\033[0m")
-    elif level == "DEBUG":
-        print(f"\033[94m{message}\033[0m")
-    elif level == "INFO":
-        print(f"\033[92m{message}\033[0m")
-    else:
-        pass
+min_level = LEVELS["DEBUG"]
+json_format = False
+log_file = None
+
+records = queue.SimpleQueue()
+writer = None
+writer_lock = threading.Lock()
+
+
+def configure(level="DEBUG", file=None, format="text"):
+    global min_level, json_format, log_file
+    min_level = LEVELS[level.upper()]
+    json_format = format == "json"
+    if log_file is not None:
+        log_file.close()
+    log_file = open(file, "a", encoding="utf-8") if file else None
+
+
+def is_enabled(level):
+    return LEVELS[level] >= min_level
+
+
+def log(message, level="INFO", *args):
+    # checked before anything is formatted, so disabled levels cost one lookup
+    if LEVELS[level] < min_level:
+        return
+    if callable(message):
+        message = message()
+    elif args:
+        message = message % args
+    records.put((time.time(), level, message))
+    if writer is None:
+        start_writer()
+
+
+def format_record(timestamp, level, message):
+    if json_format:
+        return json.dumps(
+            {
+                "time": datetime.fromtimestamp(timestamp).isoformat(
+                    timespec="milliseconds"
+                ),
+                "level": level,
+                "message": message,
+            }
+        )
+    timestamp_str = datetime.fromtimestamp(timestamp).strftime("%Y-%m-%d %H:%M:%S")
+    return f"{timestamp_str} {level}\t{message}"
+
+
+def write_records():
+    while True:
+        record = records.get()
+        if record is None:
+            break
+        line = format_record(*record)
+        if json_format:
+            sys.stdout.write(line + "\n")
+        else:
+            sys.stdout.write(f"{COLORS[record[1]]}{line}\033[0m\n")
+        if log_file is not None:
+            log_file.write(line + "\n")
+        # only flush once the queue is drained to batch bursts of messages
+        if records.empty():
+            sys.stdout.flush()
+            if log_file is not None:
+                log_file.flush()
+
+
+def start_writer():
+    global writer
+    with writer_lock:
+        if writer is not None:
+            return
+        writer = threading.Thread(target=write_records, name="logger", daemon=True)
+        writer.start()
+
+
+def flush(timeout=5):
+    global writer
+    with writer_lock:
+        if writer is None:
+            return
+        records.put(None)
+        writer.join(timeout)
+        writer = None
+
+
+atexit.register(flush)
@@ -1,23 +1,145 @@
+import asyncio
 import discord
 from dotenv import load_dotenv
 import os
+import random
+import sys
+import time
 import embed_generator
+import logger
+import metrics
 import riot_api
+from gateway import RiotGateway, RiotGatewayClient
+from leaderboard import Leaderboard, RosterStore
+from live_poller import LiveGamePoller
+from match_store import MatchStore
+from prefetcher import MatchPrefetcher
+from riot_id_index import riot_ids
+from static_data import static_data, queue_short_names
 
 from logger import log
 
 
+def create_riot_client(region):
+    match_store = None
+    if os.getenv("MATCH_STORE_PATH"):
+        match_store = MatchStore(
+            os.getenv("MATCH_STORE_PATH"),
+            max_bytes=int(os.getenv("MATCH_STORE_MAX_MB", 512)) * 1024 * 1024,
+        )
+    return riot_api.RiotAPI(
+        os.getenv("RIOT_TOKEN"),
+        region,
+        timeout=float(os.getenv("RIOT_REQUEST_TIMEOUT", 10)),
+        max_connections_per_host=int(os.getenv("RIOT_MAX_CONNECTIONS_PER_HOST", 20)),
+        match_concurrency=int(os.getenv("RIOT_MATCH_CONCURRENCY", 8)),
+        max_retries=int(os.getenv("RIOT_MAX_RETRIES", 3)),
+        request_deadline=float(os.getenv("RIOT_REQUEST_DEADLINE", 15)),
+        breaker_threshold=int(os.getenv("RIOT_BREAKER_THRESHOLD", 5)),
+        breaker_reset=float(os.getenv("RIOT_BREAKER_RESET", 30)),
+        not_found_ttl=int(os.getenv("RIOT_NOT_FOUND_TTL", 300)),
+        match_store=match_store,
+    )
+
+
+def create_metrics_server():
+    if not os.getenv("METRICS_PORT"):
+        return None
+    return metrics.MetricsServer(
+        os.getenv("METRICS_HOST", "127.0.0.1"), int(os.getenv("METRICS_PORT"))
+    )
+
+
+async def run_gateway(region):
+    # one process owns the Riot client, caches and rate limits for every shard
+    riot_client = create_riot_client(region)
+    gateway = RiotGateway(riot_client, os.getenv("RIOT_GATEWAY_SOCKET"))
+    metrics_server = create_metrics_server()
+    await static_data.start(os.getenv("STATIC_DATA_DIR", "data/static"))
+    if metrics_server is not None:
+        await metrics_server.start()
+    try:
+        async with riot_client:
+            await gateway.start()
+            await asyncio.Event().wait()
+    finally:
+        await gateway.close()
+        await static_data.close()
+        if metrics_server is not None:
+            await metrics_server.close()
+
+
 def main():
     load_dotenv()
+    logger.configure(
+        os.getenv("LOG_LEVEL", "DEBUG"),
+        os.getenv("LOG_FILE"),
+        os.getenv("LOG_FORMAT", "text"),
+    )
     intents = discord.Intents.default()
 
     # Riot API constants
     region = os.getenv("REGION", "europe")
     default_server = os.getenv("DEFAULT_SERVER", "EUNE")
 
-    bot = discord.Client(intents=intents)
+    if sys.argv[1:] == ["gateway"]:
+        try:
+            asyncio.run(run_gateway(region))
+        except KeyboardInterrupt:
+            pass
+        return
+
+    owns_guild = None
+    if os.getenv("SHARD_COUNT"):
+        shard_ids = None
+        if os.getenv("SHARD_IDS"):
+            shard_ids = [int(x) for x in os.getenv("SHARD_IDS").split(",")]
+            shard_count = int(os.getenv("SHARD_COUNT"))
+            owned_shards = set(shard_ids)
+            # Discord's shard formula, so only our guilds' rosters are refreshed
+            owns_guild = lambda guild_id: (guild_id >> 22) % shard_count in owned_shards
+        bot = discord.AutoShardedClient(
+            intents=intents,
+            shard_count=int(os.getenv("SHARD_COUNT")),
+            shard_ids=shard_ids,
+        )
+    else:
+        bot = discord.Client(intents=intents)
     command_tree = discord.app_commands.CommandTree(client=bot)
-    riot_client = riot_api.RiotAPI(os.getenv("RIOT_TOKEN"), region)
+    if os.getenv("RIOT_GATEWAY_SOCKET"):
+        riot_client = RiotGatewayClient(os.getenv("RIOT_GATEWAY_SOCKET"), region)
+    else:
+        riot_client = create_riot_client(region)
+
+    prefetcher = MatchPrefetcher(
+        riot_client,
+        budget=int(os.getenv("PREFETCH_BUDGET", 10)),
+        min_headroom=float(os.getenv("PREFETCH_MIN_HEADROOM", 0.5)),
+    )
+    metrics.stats_collector("lolbot_prefetch", prefetcher.stats)
+
+    metrics_server = create_metrics_server()
+
+    leaderboard = Leaderboard(
+        riot_client,
+        RosterStore(os.getenv("LEADERBOARD_PATH", "data/leaderboard.db")),
+        refresh_interval=int(os.getenv("LEADERBOARD_REFRESH_MINUTES", 30)) * 60,
+        max_members=int(os.getenv("LEADERBOARD_MAX_MEMBERS", 200)),
+        owns_guild=owns_guild,
+    )
+
+    live_poll_interval = int(os.getenv("LIVE_POLL_SECONDS", 60))
+    live_poller = LiveGamePoller(
+        riot_client,
+        game_interval=live_poll_interval,
+        idle_interval=live_poll_interval,
+        watch_time=int(os.getenv("LIVE_WATCH_MINUTES", 60)) * 60,
+        max_players=int(os.getenv("LIVE_MAX_PLAYERS", 100)),
+    )
+    metrics.stats_collector("lolbot_live", live_poller.stats)
+
+    history_streaming = os.getenv("HISTORY_STREAMING", "1") == "1"
+    history_edit_interval = float(os.getenv("HISTORY_EDIT_INTERVAL", 1))
 
     @bot.event
     async def on_ready():
@@ -28,7 +150,22 @@ def main():
             activity=discord.CustomActivity(name="Check /help for more info"),
         )
 
+    @command_tree.error
+    async def on_command_error(interaction, error):
+        original = getattr(error, "original", error)
+        if isinstance(original, riot_api.RiotUnavailableError):
+            log(f"Command {interaction.command.name} failed: {original}", "WARNING")
+            message = riot_unavailable()
+        else:
+            log(f"Command {interaction.command.name} failed: {original!r}", "ERROR")
+            message = "Something went wrong, please try again later!"
+        if interaction.response.is_done():
+            await interaction.followup.send(message)
+        else:
+            await interaction.response.send_message(message)
+
     @command_tree.command(name="match", description="Shows n-th last match of a player")
+    @metrics.timed("match")
     async def match(
         interaction: discord.Interaction,
         name: str,
@@ -43,33 +180,40 @@ def main():
             await interaction.response.send_message(invalid_server(server))
             return
 
+        if int(id) > 100 or int(id) < 1:
+            await interaction.response.send_message(
+                f"You can only see your last 100 matches!"
+            )
+            return
+
+        # Riot requests can retry for longer than Discord's 3 second reply window
+        await interaction.response.defer()
+
         puuid = await riot_client.get_riot_account_puuid(name, tag)
         if puuid is None:
-            await interaction.response.send_message(riot_account_not_found(name, tag))
+            await interaction.followup.send(riot_account_not_found(name, tag))
             return
+        riot_ids.record(interaction.guild_id, name, tag)
 
         summoner = await riot_client.get_summoner_by_puuid(puuid, server_code)
-        if summoner["status_code"] != 200:
-            await interaction.response.send_message(
+        if summoner is None:
+            await interaction.followup.send(
                 summoner_not_found(name, tag, server.upper())
             )
             return
 
-        if int(id) > 100 or int(id) < 1:
-            await interaction.response.send_message(
-                f"You can only see your last 100 matches!"
-            )
-            return
         match_info = await riot_client.get_recent_match_info(
             puuid, server_code, int(id) - 1
         )
         if match_info is None:
-            await interaction.response.send_message(f"Match not found!")
+            await interaction.followup.send(f"Match not found!")
             return
+        prefetcher.record(match_info.id)
         embed = embed_generator.generate_match_embed(match_info, puuid)
-        await interaction.response.send_message(embed=embed)
+        await interaction.followup.send(embed=embed)
 
     @command_tree.command(name="profile", description="Shows profile of a player")
+    @metrics.timed("profile")
     async def profile(
         interaction: discord.Interaction, name: str, tag: str, server: str = "EUNE"
     ):
@@ -80,24 +224,28 @@ def main():
             await interaction.response.send_message(invalid_server(server))
             return
 
+        await interaction.response.defer()
+
         puuid = await riot_client.get_riot_account_puuid(name, tag)
         if puuid is None:
-            await interaction.response.send_message(riot_account_not_found(name, tag))
+            await interaction.followup.send(riot_account_not_found(name, tag))
             return
+        riot_ids.record(interaction.guild_id, name, tag)
 
         data = await riot_client.get_profile_info(puuid, server_code)
         if data["status_code"] != 200:
-            await interaction.response.send_message(
+            await interaction.followup.send(
                 summoner_not_found(name, tag, server.upper())
             )
             return
         user = data["user"]
         embed = embed_generator.generate_user_embed(user)
-        await interaction.response.send_message(embed=embed)
+        await interaction.followup.send(embed=embed)
 
     @command_tree.command(
         name="history", description="Shows last n matches of a player"
     )
+    @metrics.timed("history")
     async def history(
         interaction: discord.Interaction,
         name: str,
@@ -111,7 +259,7 @@ def main():
 
         server_code = get_server_code(server)
         if server_code is None:
-            await interaction.response.send_message(invalid_server(server))
+            await interaction.followup.send(invalid_server(server))
             return
 
         if count > 20 or count < 1:
@@ -119,22 +267,293 @@ def main():
 
         puuid = await riot_client.get_riot_account_puuid(name, tag)
         if puuid is None:
-            await interaction.response.send_message(riot_account_not_found(name, tag))
+            await interaction.followup.send(riot_account_not_found(name, tag))
             return
+        riot_ids.record(interaction.guild_id, name, tag)
 
-        data = await riot_client.get_recent_matches_infos(
-            puuid, server_code, int(count)
-        )
+        if history_streaming and isinstance(riot_client, riot_api.RiotAPI):
+            data = await stream_history(interaction, puuid, server_code, int(count))
+        else:
+            data = await riot_client.get_recent_matches_infos(
+                puuid, server_code, int(count)
+            )
+            if len(data[0]) > 0:
+                nametag = await riot_client.get_riot_nametag_by_puuid(puuid)
+                embed = embed_generator.generate_history_embed(data, nametag)
+                await interaction.followup.send(embed=embed)
         if len(data[0]) <= 0:
-            await interaction.response.send_message(
+            await interaction.followup.send(
                 f"No match history found for summoner {name}#{tag}"
             )
             return
+        # people usually follow up with /match for one of these games
+        prefetcher.schedule([match.id for match in data[0]])
+
+    async def stream_history(interaction, puuid, server_code, count):
+        match_ids, summoner = await riot_client.get_recent_matches_ids(
+            puuid, server_code, count
+        )
+        if not match_ids:
+            return [[], summoner]
         nametag = await riot_client.get_riot_nametag_by_puuid(puuid)
-        embed = embed_generator.generate_history_embed(data, nametag)
+        color = random.randint(0, 16777215)
+        results = [None] * len(match_ids)
+        finished = [False] * len(match_ids)
+        shown = 0
+        last_edit = 0.0
+
+        def ready():
+            # only the in-order prefix is shown, so rows never jump around
+            matches = []
+            for match_info, done in zip(results, finished):
+                if not done:
+                    break
+                if match_info is not None:
+                    matches.append(match_info)
+            return matches
+
+        async for index, match_info in riot_client.stream_matches_infos(match_ids):
+            results[index] = match_info
+            finished[index] = True
+            matches = ready()
+            if len(matches) <= shown:
+                continue
+            now = time.monotonic()
+            if shown and now - last_edit < history_edit_interval:
+                continue
+            embed = embed_generator.generate_history_embed(
+                [matches, summoner], nametag, len(match_ids), color
+            )
+            await interaction.edit_original_response(embed=embed)
+            shown = len(matches)
+            last_edit = time.monotonic()
+        matches = [match_info for match_info in results if match_info is not None]
+        if matches and (shown < len(matches) or len(matches) < len(match_ids)):
+            embed = embed_generator.generate_history_embed(
+                [matches, summoner], nametag, color=color
+            )
+            await interaction.edit_original_response(embed=embed)
+        return [matches, summoner]
+
+    @command_tree.command(
+        name="stats", description="Shows winrate and KDA per champion of a player"
+    )
+    @discord.app_commands.choices(
+        queue=[
+            discord.app_commands.Choice(name=queue_name, value=queue_id)
+            for queue_id, queue_name in queue_short_names.items()
+        ]
+    )
+    @metrics.timed("stats")
+    async def stats(
+        interaction: discord.Interaction,
+        name: str,
+        tag: str,
+        count: int = 100,
+        queue: int = None,
+    ):
+        log_command(interaction)
+
+        await interaction.response.defer()  # loads up to 100 games on first use
+
+        if count > 100 or count < 1:
+            count = 100
+
+        puuid = await riot_client.get_riot_account_puuid(name, tag)
+        if puuid is None:
+            await interaction.followup.send(riot_account_not_found(name, tag))
+            return
+        riot_ids.record(interaction.guild_id, name, tag)
+
+        data = await riot_client.get_player_stats(puuid, count, queue)
+        if data is None or data["games"] <= 0:
+            await interaction.followup.send(
+                f"No match history found for summoner {name}#{tag}"
+            )
+            return
+        nametag = await riot_client.get_riot_nametag_by_puuid(puuid)
+        queue_name = queue_short_names[queue] if queue is not None else "All queues"
+        embed = embed_generator.generate_stats_embed(data, nametag, queue_name)
         await interaction.followup.send(embed=embed)
 
+    @command_tree.command(
+        name="register", description="Adds a player to this server's leaderboard"
+    )
+    @metrics.timed("register")
+    async def register(
+        interaction: discord.Interaction,
+        name: str,
+        tag: str,
+        server: str = default_server,
+    ):
+        log_command(interaction)
+
+        if interaction.guild_id is None:
+            await interaction.response.send_message(guild_only())
+            return
+
+        server_code = get_server_code(server)
+        if server_code is None:
+            await interaction.response.send_message(invalid_server(server))
+            return
+
+        if leaderboard.is_full(interaction.guild_id):
+            await interaction.response.send_message(
+                f"This server's leaderboard is full ({leaderboard.max_members} players)!"
+            )
+            return
+
+        await interaction.response.defer()
+
+        puuid = await riot_client.get_riot_account_puuid(name, tag)
+        if puuid is None:
+            await interaction.followup.send(riot_account_not_found(name, tag))
+            return
+        riot_ids.record(interaction.guild_id, name, tag)
+
+        if leaderboard.is_member(interaction.guild_id, puuid):
+            await interaction.followup.send(
+                f"{name}#{tag} is already on the leaderboard!"
+            )
+            return
+        player = await leaderboard.register(interaction.guild_id, puuid, server_code)
+        if player is None:
+            await interaction.followup.send(
+                summoner_not_found(name, tag, server.upper())
+            )
+            return
+        await interaction.followup.send(f"Added {player.name} to the leaderboard!")
+
+    @command_tree.command(
+        name="unregister", description="Removes a player from this server's leaderboard"
+    )
+    @metrics.timed("unregister")
+    async def unregister(interaction: discord.Interaction, name: str, tag: str):
+        log_command(interaction)
+
+        if interaction.guild_id is None:
+            await interaction.response.send_message(guild_only())
+            return
+
+        await interaction.response.defer()
+
+        puuid = await riot_client.get_riot_account_puuid(name, tag)
+        if puuid is None or not await leaderboard.unregister(
+            interaction.guild_id, puuid
+        ):
+            await interaction.followup.send(f"{name}#{tag} is not on the leaderboard!")
+            return
+        await interaction.followup.send(f"Removed {name}#{tag} from the leaderboard!")
+
+    @command_tree.command(
+        name="leaderboard", description="Ranks this server's players by Solo/Duo rank"
+    )
+    @metrics.timed("leaderboard")
+    async def leaderboard_command(interaction: discord.Interaction):
+        log_command(interaction)
+
+        if interaction.guild_id is None:
+            await interaction.response.send_message(guild_only())
+            return
+
+        ranking = leaderboard.ranking(interaction.guild_id)
+        if not ranking:
+            await interaction.response.send_message(
+                "Nobody is on this server's leaderboard yet, use /register to add players!"
+            )
+            return
+        embed = embed_generator.generate_leaderboard_embed(
+            ranking, interaction.guild.name
+        )
+        await interaction.response.send_message(embed=embed)
+
+    @command_tree.command(
+        name="live", description="Shows the game a player is in and keeps it updated"
+    )
+    @metrics.timed("live")
+    async def live(
+        interaction: discord.Interaction,
+        name: str,
+        tag: str,
+        server: str = default_server,
+    ):
+        log_command(interaction)
+
+        server_code = get_server_code(server)
+        if server_code is None:
+            await interaction.response.send_message(invalid_server(server))
+            return
+
+        await interaction.response.defer()
+
+        puuid = await riot_client.get_riot_account_puuid(name, tag)
+        if puuid is None:
+            await interaction.followup.send(riot_account_not_found(name, tag))
+            return
+        riot_ids.record(interaction.guild_id, name, tag)
+
+        if live_poller.is_full(puuid, server_code):
+            await interaction.followup.send(
+                "Too many live games are followed right now, please try again later!"
+            )
+            return
+        summoner = await riot_client.get_summoner_by_puuid(puuid, server_code)
+        if summoner is None:
+            await interaction.followup.send(
+                summoner_not_found(name, tag, server.upper())
+            )
+            return
+
+        nametag = await riot_client.get_riot_nametag_by_puuid(puuid)
+        message = None
+
+        async def update(game, final):
+            # a poll shared with other messages can tick before this one is sent
+            if message is None:
+                return
+            embed = embed_generator.generate_live_embed(game, nametag, puuid, final)
+            await message.edit(embed=embed)
+
+        # every message following this player shares one poll
+        game = await live_poller.subscribe(puuid, server_code, update)
+        embed = embed_generator.generate_live_embed(game, nametag, puuid)
+        try:
+            sent = await interaction.followup.send(embed=embed, wait=True)
+            # the interaction token expires after 15 minutes, the bot's message doesn't
+            message = interaction.channel.get_partial_message(sent.id)
+        except Exception:
+            live_poller.unsubscribe(puuid, server_code, update)
+            raise
+
+    @match.autocomplete("name")
+    @profile.autocomplete("name")
+    @history.autocomplete("name")
+    @stats.autocomplete("name")
+    @register.autocomplete("name")
+    @unregister.autocomplete("name")
+    @live.autocomplete("name")
+    async def name_autocomplete(interaction: discord.Interaction, current: str):
+        return [
+            discord.app_commands.Choice(name=str(name_tag), value=name_tag.name)
+            for name_tag in riot_ids.complete_name(current, interaction.guild_id)
+        ]
+
+    @match.autocomplete("tag")
+    @profile.autocomplete("tag")
+    @history.autocomplete("tag")
+    @stats.autocomplete("tag")
+    @register.autocomplete("tag")
+    @unregister.autocomplete("tag")
+    @live.autocomplete("tag")
+    async def tag_autocomplete(interaction: discord.Interaction, current: str):
+        name = interaction.namespace.name or ""
+        return [
+            discord.app_commands.Choice(name=str(name_tag), value=name_tag.tag)
+            for name_tag in riot_ids.complete_tag(name, current, interaction.guild_id)
+        ]
+
     @command_tree.command(name="help", description="Shows all available commands")
+    @metrics.timed("help")
     async def help(interaction: discord.Interaction):
         log_command(interaction)
 
@@ -167,10 +586,36 @@ def main():
     def summoner_not_found(gameName, tagLine, server):
         return f"Summoner {gameName}#{tagLine} doesn't exist on the {server} server!"
 
+    def riot_unavailable():
+        return "Riot API is not responding right now, please try again in a minute!"
+
+    def guild_only():
+        return "Leaderboards are only available in servers!"
+
     def invalid_server(server):
         return f"Server {server} doesn't exsit! Please use one of the following: {', '.join(riot_client.server_names.keys())}"
 
-    bot.run(os.environ.get("DISCORD_TOKEN"))
+    async def run():
+        await static_data.start(os.getenv("STATIC_DATA_DIR", "data/static"))
+        if metrics_server is not None:
+            await metrics_server.start()
+        try:
+            async with riot_client, bot:
+                await leaderboard.start()
+                await bot.start(os.environ.get("DISCORD_TOKEN"))
+        finally:
+            await leaderboard.close()
+            await live_poller.close()
+            await prefetcher.close()
+            await static_data.close()
+            if metrics_server is not None:
+                await metrics_server.close()
+
+    discord.utils.setup_logging()
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
 
 
 if __name__ == "__main__":
@@ -0,0 +1,122 @@
+import json
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# the only match-v5 fields parse_match_info reads
+INFO_FIELDS = ("gameStartTimestamp", "gameDuration", "queueId")
+PARTICIPANT_FIELDS = (
+    "puuid",
+    "riotIdGameName",
+    "riotIdTagline",
+    "kills",
+    "deaths",
+    "assists",
+    "championName",
+    "championId",
+    "goldEarned",
+    "totalDamageDealtToChampions",
+    "totalMinionsKilled",
+    "neutralMinionsKilled",
+    "visionScore",
+    "teamId",
+    "win",
+    "doubleKills",
+    "tripleKills",
+    "quadraKills",
+    "pentaKills",
+    "individualPosition",
+)
+FIELDS = frozenset(PARTICIPANT_FIELDS)
+
+if msgspec is not None:
+    # unknown fields are skipped by the parser, so the other ~120 fields of
+    # every participant and the team and objective blocks are never built
+
+    class Participant(msgspec.Struct):
+        puuid: str
+        kills: int
+        deaths: int
+        assists: int
+        championName: str
+        championId: int
+        goldEarned: int
+        totalDamageDealtToChampions: int
+        totalMinionsKilled: int
+        neutralMinionsKilled: int
+        visionScore: int
+        teamId: int
+        win: bool
+        doubleKills: int
+        tripleKills: int
+        quadraKills: int
+        pentaKills: int
+        individualPosition: str
+        riotIdGameName: str | None = None
+        riotIdTagline: str | None = None
+
+    class Info(msgspec.Struct):
+        gameStartTimestamp: int
+        gameDuration: int
+        queueId: int
+        participants: list[Participant]
+
+    class Match(msgspec.Struct):
+        info: Info
+
+    match_decoder = msgspec.json.Decoder(Match)
+    json_decoder = msgspec.json.Decoder()
+    BACKEND = "msgspec"
+elif orjson is not None:
+    BACKEND = "orjson"
+else:
+    BACKEND = "json"
+
+
+def loads(body):
+    if msgspec is not None:
+        try:
+            return json_decoder.decode(body)
+        except msgspec.DecodeError as e:
+            raise ValueError(str(e)) from e
+    if orjson is not None:
+        return orjson.loads(body)
+    return json.loads(body)
+
+
+def decode_match(body):
+    # returns {"info": {...}} holding only INFO_FIELDS and PARTICIPANT_FIELDS
+    if msgspec is not None:
+        try:
+            match = match_decoder.decode(body)
+        except msgspec.DecodeError as e:
+            raise ValueError(str(e)) from e
+        info = match.info
+        return {
+            "info": {
+                "gameStartTimestamp": info.gameStartTimestamp,
+                "gameDuration": info.gameDuration,
+                "queueId": info.queueId,
+                "participants": [
+                    msgspec.structs.asdict(participant)
+                    for participant in info.participants
+                ],
+            }
+        }
+    try:
+        info = loads(body)["info"]
+        selected = {name: info[name] for name in INFO_FIELDS}
+        selected["participants"] = [
+            {name: value for name, value in participant.items() if name in FIELDS}
+            for participant in info["participants"]
+        ]
+    except (KeyError, TypeError, AttributeError) as e:
+        raise ValueError(f"Unexpected match payload: {e!r}") from e
+    return {"info": selected}
@@ -0,0 +1,94 @@
+import time
+import zlib
+
+from logger import log
+from sqlite_store import SQLiteStore
+
+# index i upgrades the schema from version i to i + 1
+MIGRATIONS = [
+    [
+        """CREATE TABLE matches (
+            match_id TEXT PRIMARY KEY,
+            data BLOB NOT NULL,
+            size INTEGER NOT NULL,
+            last_access REAL NOT NULL
+        )""",
+        "CREATE INDEX matches_last_access ON matches (last_access)",
+    ],
+]
+
+
+class MatchStore(SQLiteStore):
+    def __init__(self, path, max_bytes=512 * 1024 * 1024, compression_level=6):
+        super().__init__(path, MIGRATIONS)
+        self.max_bytes = max_bytes
+        self.compression_level = compression_level
+        self.size = 0
+
+    def __str__(self):
+        return f"MatchStore(path={self.path}, max_bytes={self.max_bytes})"
+
+    async def get(self, match_id):
+        return await self.run(f"read match {match_id} from", self._get, match_id)
+
+    async def put(self, match_id, body):
+        await self.run(f"write match {match_id} to", self._put, match_id, body)
+
+    def _opened(self):
+        self.size = self.connection.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM matches"
+        ).fetchone()[0]
+        log(f"Opened {self} holding {self.size} bytes", "DEBUG")
+
+    def _newer_schema(self, version):
+        # it is only a cache, so start over
+        log(
+            f"Match store schema {version} is newer than {len(MIGRATIONS)}, recreating",
+            "WARNING",
+        )
+        self.connection.execute("DROP TABLE IF EXISTS matches")
+        return 0
+
+    def _get(self, match_id):
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT data FROM matches WHERE match_id = ?", (match_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            with self.connection:
+                self.connection.execute(
+                    "UPDATE matches SET last_access = ? WHERE match_id = ?",
+                    (time.time(), match_id),
+                )
+        return zlib.decompress(row[0])
+
+    def _put(self, match_id, body):
+        # the response body as Riot sent it, decoded only when read
+        blob = zlib.compress(body, self.compression_level)
+        with self.lock, self.connection:
+            row = self.connection.execute(
+                "SELECT size FROM matches WHERE match_id = ?", (match_id,)
+            ).fetchone()
+            if row is not None:
+                self.size -= row[0]
+            self.connection.execute(
+                "INSERT OR REPLACE INTO matches VALUES (?, ?, ?, ?)",
+                (match_id, blob, len(blob), time.time()),
+            )
+            self.size += len(blob)
+            if self.size > self.max_bytes:
+                self._evict(int(self.max_bytes * 0.9))
+
+    def _evict(self, target):
+        evicted = []
+        rows = self.connection.execute(
+            "SELECT match_id, size FROM matches ORDER BY last_access"
+        )
+        for match_id, size in rows:
+            if self.size <= target:
+                break
+            evicted.append((match_id,))
+            self.size -= size
+        self.connection.executemany("DELETE FROM matches WHERE match_id = ?", evicted)
+        log(f"Evicted {len(evicted)} matches from {self}", "DEBUG")
@@ -0,0 +1,150 @@
+import asyncio
+import contextlib
+import time
+
+from cache import LRUCache, MISSING
+from logger import log
+from rate_limiter import run_in_background
+
+# the most match IDs match-v5 returns for a single request
+PAGE_SIZE = 100
+
+
+class MatchTimeline:
+    __slots__ = ("ids", "known", "refreshed_at", "refreshed_epoch", "exhausted")
+
+    def __init__(self):
+        self.ids = []
+        self.known = set()
+        self.refreshed_at = None
+        self.refreshed_epoch = None
+        self.exhausted = False
+
+    def prepend(self, ids):
+        new_ids = [id for id in ids if id not in self.known]
+        self.ids[:0] = new_ids
+        self.known.update(new_ids)
+        return len(new_ids)
+
+    def append(self, ids):
+        new_ids = [id for id in ids if id not in self.known]
+        self.ids.extend(new_ids)
+        self.known.update(new_ids)
+        return len(new_ids)
+
+    def reset(self, ids):
+        self.ids = list(ids)
+        self.known = set(ids)
+        self.exhausted = False
+
+
+class MatchTimelineIndex:
+    def __init__(
+        self, fetch, ttl=60, overlap=3600, max_bytes=8 * 1024 * 1024, stale_ttl=0
+    ):
+        # fetch(puuid, start, count, start_time) returns a list of IDs or None
+        self.fetch = fetch
+        self.ttl = ttl
+        # a timeline up to this much older than ttl is served while it refreshes
+        self.stale_ttl = stale_ttl
+        self.overlap = overlap
+        self.timelines = LRUCache("MatchTimelineIndex", 3600 * 24, max_bytes)
+        # puuid -> [lock, number of callers using it], kept out of the cache
+        # so the lock doesn't count towards its memory budget
+        self.locks = {}
+        self.revalidations = {}
+
+    @contextlib.asynccontextmanager
+    async def locked(self, puuid):
+        entry = self.locks.setdefault(puuid, [asyncio.Lock(), 0])
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self.locks[puuid]
+
+    async def get(self, puuid, start=0, count=20):
+        async with self.locked(puuid):
+            timeline = self.timelines.get(puuid)
+            if timeline is MISSING:
+                timeline = MatchTimeline()
+            now = time.monotonic()
+            if timeline.refreshed_at is None:
+                await self.load(puuid, timeline, start + count)
+            elif timeline.refreshed_at + self.ttl <= now:
+                stale_until = timeline.refreshed_at + self.ttl + self.stale_ttl
+                if now < stale_until and start + count <= len(timeline.ids):
+                    self.revalidate(puuid)
+                else:
+                    await self.refresh(puuid, timeline)
+            if timeline.refreshed_at is None:
+                return []
+            if start + count > len(timeline.ids) and not timeline.exhausted:
+                await self.extend(puuid, timeline, start + count)
+            self.timelines.set(puuid, timeline)
+            return timeline.ids[start : start + count]
+
+    def revalidate(self, puuid):
+        if puuid in self.revalidations:
+            return
+        task = run_in_background(self.background_refresh(puuid))
+        self.revalidations[puuid] = task
+        task.add_done_callback(lambda task: self.revalidations.pop(puuid, None))
+
+    async def background_refresh(self, puuid):
+        try:
+            async with self.locked(puuid):
+                timeline = self.timelines.get(puuid, count=False)
+                if timeline is MISSING or timeline.refreshed_at is None:
+                    return
+                if timeline.refreshed_at + self.ttl > time.monotonic():
+                    return
+                await self.refresh(puuid, timeline)
+                self.timelines.set(puuid, timeline)
+        except Exception as e:
+            log(f"Background refresh of timeline {puuid} failed: {e!r}", "WARNING")
+
+    async def load(self, puuid, timeline, target):
+        count = min(max(target, 20), PAGE_SIZE)
+        refreshed_epoch = int(time.time())
+        ids = await self.fetch(puuid, 0, count)
+        if ids is None:
+            return
+        timeline.reset(ids)
+        timeline.exhausted = len(ids) < count
+        timeline.refreshed_at = time.monotonic()
+        timeline.refreshed_epoch = refreshed_epoch
+
+    async def refresh(self, puuid, timeline):
+        # matches that were in progress during the last refresh started before
+        # it, so look back a bit further than that
+        start_time = timeline.refreshed_epoch - self.overlap
+        refreshed_epoch = int(time.time())
+        ids = await self.fetch(puuid, 0, PAGE_SIZE, start_time)
+        if ids is None:
+            return
+        if len(ids) == PAGE_SIZE:
+            # there may be a gap between this page and what we know
+            timeline.reset(ids)
+        else:
+            added = timeline.prepend(ids)
+            log("Added %d new match IDs to timeline of %s", "TRACE", added, puuid)
+        timeline.refreshed_at = time.monotonic()
+        timeline.refreshed_epoch = refreshed_epoch
+
+    async def extend(self, puuid, timeline, target):
+        # new matches only shift older ones back, so an offset from the known
+        # length can return duplicates but never skip a match
+        while len(timeline.ids) < target and not timeline.exhausted:
+            count = min(max(target - len(timeline.ids), 20), PAGE_SIZE)
+            ids = await self.fetch(puuid, len(timeline.ids), count)
+            if ids is None:
+                return
+            added = timeline.append(ids)
+            if len(ids) < count:
+                timeline.exhausted = True
+            elif added == 0:
+                break
@@ -0,0 +1,205 @@
+import asyncio
+import bisect
+import functools
+import time
+from aiohttp import web
+
+from cache import cache_stats
+from logger import log
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+registry = []
+collectors = []
+
+
+def format_labels(names, values):
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{value}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+class Counter:
+    type = "counter"
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.values = {}
+        registry.append(self)
+
+    def inc(self, *label_values, amount=1):
+        self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    def samples(self):
+        for label_values, value in self.values.items():
+            yield f"{self.name}{format_labels(self.labels, label_values)} {value}"
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} {self.type}"
+        yield from self.samples()
+
+
+class Histogram(Counter):
+    type = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = buckets
+
+    def observe(self, value, *label_values):
+        series = self.values.get(label_values)
+        if series is None:
+            # per-bucket counts, sum, count
+            series = self.values[label_values] = [[0] * len(self.buckets), 0.0, 0]
+        index = bisect.bisect_left(self.buckets, value)
+        if index < len(self.buckets):
+            series[0][index] += 1
+        series[1] += value
+        series[2] += 1
+
+    def samples(self):
+        for label_values, (counts, total, count) in self.values.items():
+            names = self.labels + ("le",)
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                labels = format_labels(names, label_values + (bound,))
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = format_labels(names, label_values + ("+Inf",))
+            yield f"{self.name}_bucket{labels} {count}"
+            labels = format_labels(self.labels, label_values)
+            yield f"{self.name}_sum{labels} {total}"
+            yield f"{self.name}_count{labels} {count}"
+
+
+command_latency = Histogram(
+    "lolbot_command_duration_seconds",
+    "Time spent handling a slash command",
+    ("command",),
+)
+riot_request_latency = Histogram(
+    "lolbot_riot_request_duration_seconds",
+    "Latency of a single Riot API request",
+    ("method",),
+)
+riot_responses = Counter(
+    "lolbot_riot_responses_total",
+    "Riot API responses by endpoint and status code",
+    ("method", "status"),
+)
+riot_retries = Counter(
+    "lolbot_riot_retries_total",
+    "Riot API requests retried after a server error or timeout",
+    ("method",),
+)
+riot_circuit_opens = Counter(
+    "lolbot_riot_circuit_open_total",
+    "Times the circuit breaker for a Riot host opened",
+    ("host",),
+)
+rate_limit_wait = Histogram(
+    "lolbot_rate_limit_wait_seconds",
+    "Time a request waited in the rate limit queue",
+    ("host",),
+)
+event_loop_lag = Histogram(
+    "lolbot_event_loop_lag_seconds",
+    "How late the event loop woke up a sleeping task",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1),
+)
+
+
+def collect_caches():
+    stats = cache_stats()
+    for key, type in (
+        ("hits", "counter"),
+        ("stale_hits", "counter"),
+        ("misses", "counter"),
+        ("evictions", "counter"),
+        ("expirations", "counter"),
+        ("entries", "gauge"),
+        ("bytes", "gauge"),
+    ):
+        suffix = "_total" if type == "counter" else ""
+        name = f"lolbot_cache_{key}{suffix}"
+        yield f"# TYPE {name} {type}"
+        for cache, values in stats.items():
+            yield f'{name}{{cache="{cache}"}} {values[key]}'
+
+
+collectors.append(collect_caches)
+
+
+def stats_collector(prefix, stats):
+    def collect():
+        for key, value in stats().items():
+            yield f"# TYPE {prefix}_{key} gauge"
+            yield f"{prefix}_{key} {value}"
+
+    collectors.append(collect)
+
+
+def render():
+    lines = []
+    for metric in registry:
+        lines.extend(metric.render())
+    for collector in collectors:
+        lines.extend(collector())
+    return "\n".join(lines) + "\n"
+
+
+def timed(command):
+    def wrapper(func):
+        @functools.wraps(func)
+        async def wrapped(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                command_latency.observe(time.perf_counter() - start, command)
+
+        return wrapped
+
+    return wrapper
+
+
+async def monitor_event_loop(interval=0.5):
+    while True:
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        event_loop_lag.observe(max(time.perf_counter() - start - interval, 0.0))
+
+
+class MetricsServer:
+    def __init__(self, host="127.0.0.1", port=9100):
+        self.host = host
+        self.port = port
+        self.runner = None
+        self.monitor = None
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get("/metrics", self.handle_metrics)
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, self.host, self.port).start()
+        self.monitor = asyncio.create_task(monitor_event_loop())
+        log(f"Serving metrics on http://{self.host}:{self.port}/metrics")
+
+    async def close(self):
+        if self.monitor is not None:
+            self.monitor.cancel()
+            self.monitor = None
+        if self.runner is not None:
+            await self.runner.cleanup()
+            self.runner = None
+
+    async def handle_metrics(self, request):
+        return web.Response(
+            body=render().encode(), headers={"Content-Type": CONTENT_TYPE}
+        )
@@ -0,0 +1,140 @@
+import array
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# one int64 column per stat, rows are appended in the order matches arrive
+COLUMNS = (
+    "start_time",
+    "duration",
+    "queue_id",
+    "champion_id",
+    "win",
+    "kills",
+    "deaths",
+    "assists",
+    "gold",
+    "damage",
+    "creep_score",
+    "vision_score",
+)
+SUMMED = COLUMNS[4:] + ("duration",)
+
+
+class PlayerStats:
+    __slots__ = ("ids", "seen", "columns")
+
+    def __init__(self):
+        self.ids = []
+        # also holds remakes, which are skipped but shouldn't be fetched again
+        self.seen = set()
+        self.columns = {name: array.array("q") for name in COLUMNS}
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, match_id):
+        return match_id in self.seen
+
+    def add(self, game_info, puuid):
+        if game_info.id in self.seen:
+            return False
+        self.seen.add(game_info.id)
+        if game_info.duration < 300:
+            return False
+        for player in game_info.participants:
+            if player.puuid == puuid:
+                break
+        else:
+            return False
+        row = (
+            game_info.start_time,
+            game_info.duration,
+            game_info.queue_id,
+            player.champion_id,
+            player.team == game_info.winner,
+            player.kills,
+            player.deaths,
+            player.assists,
+            player.gold,
+            player.damage,
+            player.creep_score,
+            player.vision_score,
+        )
+        for column, value in zip(self.columns.values(), row):
+            column.append(value)
+        self.ids.append(game_info.id)
+        return True
+
+    def trim(self, max_rows=200):
+        if len(self.ids) <= max_rows:
+            return
+        start = self.columns["start_time"]
+        keep = sorted(range(len(start)), key=start.__getitem__)[-max_rows:]
+        self.ids = [self.ids[i] for i in keep]
+        self.seen = set(self.ids)
+        for name, column in self.columns.items():
+            self.columns[name] = array.array("q", (column[i] for i in keep))
+
+    def aggregate(self, match_ids, queue_id=None):
+        # only the requested games, older stored ones never fill in for remakes
+        wanted = set(match_ids)
+        if numpy is not None:
+            champions, games, sums = self.group_numpy(wanted, queue_id)
+        else:
+            champions, games, sums = self.group_python(wanted, queue_id)
+        total = {name: sum(values) for name, values in sums.items()}
+        total["games"] = sum(games)
+        rows = []
+        for i, champion_id in enumerate(champions):
+            row = {name: values[i] for name, values in sums.items()}
+            row["champion_id"] = champion_id
+            row["games"] = games[i]
+            rows.append(row)
+        rows.sort(key=lambda row: (-row["games"], -row["win"]))
+        total["champions"] = rows
+        return total
+
+    def group_numpy(self, wanted, queue_id):
+        # zero-copy views, dropped before returning so the arrays can grow again
+        columns = {
+            name: numpy.frombuffer(column, dtype=numpy.int64)
+            for name, column in self.columns.items()
+        }
+        mask = numpy.fromiter(
+            (match_id in wanted for match_id in self.ids), bool, len(self.ids)
+        )
+        if queue_id is not None:
+            mask &= columns["queue_id"] == queue_id
+        selected = numpy.flatnonzero(mask)
+        champions, groups = numpy.unique(
+            columns["champion_id"][selected], return_inverse=True
+        )
+        games = numpy.bincount(groups, minlength=len(champions))
+        sums = {
+            name: numpy.bincount(
+                groups, weights=columns[name][selected], minlength=len(champions)
+            )
+            .astype(numpy.int64)
+            .tolist()
+            for name in SUMMED
+        }
+        return champions.tolist(), games.tolist(), sums
+
+    def group_python(self, wanted, queue_id):
+        columns = self.columns
+        selected = [i for i, match_id in enumerate(self.ids) if match_id in wanted]
+        if queue_id is not None:
+            selected = [i for i in selected if columns["queue_id"][i] == queue_id]
+        groups = {}
+        for i in selected:
+            groups.setdefault(columns["champion_id"][i], []).append(i)
+        champions = sorted(groups)
+        games = [len(groups[champion]) for champion in champions]
+        sums = {
+            name: [sum(columns[name][i] for i in groups[c]) for c in champions]
+            for name in SUMMED
+        }
+        return champions, games, sums
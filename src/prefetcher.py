@@ -0,0 +1,78 @@
+import asyncio
+
+from cache import LRUCache
+from logger import log
+from rate_limiter import run_in_background
+
+
+class MatchPrefetcher:
+    def __init__(self, riot_client, budget=10, min_headroom=0.5, ttl=3600):
+        self.riot_client = riot_client
+        self.budget = budget
+        self.min_headroom = min_headroom
+        self.prefetched = LRUCache("MatchPrefetcher", ttl, 1024 * 1024)
+        self.tasks = set()
+        self.prefetches = 0
+        self.skipped = 0
+        self.lookups = 0
+        self.hits = 0
+
+    def schedule(self, match_ids):
+        if self.budget <= 0 or not match_ids:
+            return
+        task = run_in_background(self.prefetch(match_ids[: self.budget]))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def prefetch(self, match_ids):
+        for match_id in match_ids:
+            if match_id in self.prefetched:
+                continue
+            headroom = self.riot_client.rate_limiter.headroom(self.riot_client.region)
+            if headroom < self.min_headroom:
+                self.skipped += 1
+                log(
+                    "Skipping prefetch of %s, rate limit headroom %.2f",
+                    "DEBUG",
+                    match_id,
+                    headroom,
+                )
+                return
+            try:
+                # /history already cached the match itself, so the only thing
+                # /match can still miss are names the payload didn't have
+                match_info = await self.riot_client.get_match_info_by_id(match_id)
+                if match_info is None or all(
+                    player.name is not None for player in match_info.participants
+                ):
+                    continue
+                await self.riot_client.get_match_info_by_id(
+                    match_id, load_name_tags=True
+                )
+            except Exception as e:
+                log(f"Failed to prefetch match {match_id}: {e!r}", "WARNING")
+                continue
+            self.prefetched.set(match_id, True)
+            self.prefetches += 1
+
+    def record(self, match_id):
+        self.lookups += 1
+        if match_id in self.prefetched:
+            self.hits += 1
+            self.prefetched.pop(match_id)
+        log(lambda: f"Prefetch stats: {self.stats()}", "DEBUG")
+
+    def stats(self):
+        return {
+            "prefetches": self.prefetches,
+            "skipped": self.skipped,
+            "lookups": self.lookups,
+            "hits": self.hits,
+            "hit_rate": self.hits / self.lookups if self.lookups else 0.0,
+            "used_rate": self.hits / self.prefetches if self.prefetches else 0.0,
+        }
+
+    async def close(self):
+        for task in list(self.tasks):
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
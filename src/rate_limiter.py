@@ -0,0 +1,255 @@
+import asyncio
+import contextvars
+import heapq
+import itertools
+import time
+
+from cache import background_hooks
+from logger import log
+from metrics import rate_limit_wait
+
+INTERACTIVE = 0
+BACKGROUND = 1
+
+# Requests started from slash commands run as INTERACTIVE, background jobs
+# switch this to BACKGROUND so they queue behind user-facing work.
+request_priority = contextvars.ContextVar("request_priority", default=INTERACTIVE)
+# nobody waits on a stale-while-revalidate refresh either
+background_hooks.append(lambda: request_priority.set(BACKGROUND))
+
+# Riot counts windows on their side, so keep a little slack on ours
+WINDOW_MARGIN = 0.1
+
+
+def run_in_background(coro):
+    # the task gets its own copy of the context, the caller keeps its priority
+    context = contextvars.copy_context()
+    context.run(request_priority.set, BACKGROUND)
+    return asyncio.get_running_loop().create_task(coro, context=context)
+
+
+def parse_rate_limits(header):
+    limits = []
+    if not header:
+        return limits
+    for part in header.split(","):
+        count, seconds = part.strip().split(":")
+        limits.append((int(count), int(seconds)))
+    return limits
+
+
+class RateLimitWindow:
+    def __init__(self, limit, seconds):
+        self.limit = limit
+        self.seconds = seconds
+        self.count = 0
+        self.reset_at = 0.0
+
+    def used(self, now):
+        return 0 if now >= self.reset_at else self.count
+
+    def delay(self, now, limit=None):
+        limit = self.limit if limit is None else limit
+        if self.used(now) < limit:
+            return 0.0
+        return max(self.reset_at - now, 0.001)
+
+    def consume(self, now):
+        if now >= self.reset_at:
+            self.count = 0
+            self.reset_at = now + self.seconds + WINDOW_MARGIN
+        self.count += 1
+
+    def sync(self, count, now):
+        if now >= self.reset_at:
+            self.count = count
+            self.reset_at = now + self.seconds + WINDOW_MARGIN
+        else:
+            self.count = max(self.count, count)
+
+
+class RateLimitBucket:
+    def __init__(self, limits=()):
+        self.windows = {
+            seconds: RateLimitWindow(limit, seconds) for limit, seconds in limits
+        }
+        self.blocked_until = 0.0
+        # grant times until a response reports the real limits, so windows
+        # built from those start with every request already sent
+        self.unreported = []
+
+    def set_limits(self, limits, now):
+        windows = {}
+        for limit, seconds in limits:
+            window = self.windows.get(seconds)
+            if window is None:
+                window = RateLimitWindow(limit, seconds)
+                self.seed(window, now)
+            window.limit = limit
+            windows[seconds] = window
+        self.windows = windows
+        self.unreported = None
+
+    def seed(self, window, now):
+        if self.unreported is not None:
+            since = now - window.seconds
+            count = sum(1 for granted in self.unreported if granted > since)
+        else:
+            count = max((old.used(now) for old in self.windows.values()), default=0)
+        if count:
+            window.count = count
+            window.reset_at = now + window.seconds + WINDOW_MARGIN
+
+    def delay(self, now, reserve=0.0):
+        delay = max(self.blocked_until - now, 0.0)
+        for window in self.windows.values():
+            limit = max(int(window.limit * (1 - reserve)), 1)
+            delay = max(delay, window.delay(now, limit))
+        return delay
+
+    def headroom(self, now):
+        if self.blocked_until > now:
+            return 0.0
+        headroom = 1.0
+        for window in self.windows.values():
+            headroom = min(headroom, 1 - window.used(now) / window.limit)
+        return max(headroom, 0.0)
+
+    def consume(self, now):
+        for window in self.windows.values():
+            window.consume(now)
+        if self.unreported is not None:
+            self.unreported.append(now)
+
+    def sync_counts(self, counts, now):
+        for count, seconds in counts:
+            window = self.windows.get(seconds)
+            if window is not None:
+                window.sync(count, now)
+
+    def block(self, seconds, now):
+        self.blocked_until = max(self.blocked_until, now + seconds)
+
+
+class RateLimiter:
+    def __init__(
+        self,
+        default_app_limits="20:1,100:120",
+        background_reserve=0.2,
+        default_retry_after=1.0,
+    ):
+        self.default_app_limits = parse_rate_limits(default_app_limits)
+        self.background_reserve = background_reserve
+        self.default_retry_after = default_retry_after
+        self.app_buckets = {}
+        self.method_buckets = {}
+        self.queues = {}
+        self.wakeups = {}
+        self.dispatchers = {}
+        self.counter = itertools.count()
+
+    def app_bucket(self, host):
+        if host not in self.app_buckets:
+            self.app_buckets[host] = RateLimitBucket(self.default_app_limits)
+        return self.app_buckets[host]
+
+    def method_bucket(self, host, method):
+        key = (host, method)
+        if key not in self.method_buckets:
+            self.method_buckets[key] = RateLimitBucket()
+        return self.method_buckets[key]
+
+    def headroom(self, host):
+        return self.app_bucket(host).headroom(time.monotonic())
+
+    def queue_length(self, host):
+        return len(self.queues.get(host, ()))
+
+    async def acquire(self, host, method):
+        future = asyncio.get_running_loop().create_future()
+        entry = (request_priority.get(), next(self.counter), method, future)
+        heapq.heappush(self.queues.setdefault(host, []), entry)
+        self._wake(host)
+        start = time.perf_counter()
+        await future
+        rate_limit_wait.observe(time.perf_counter() - start, host)
+
+    def update(self, host, method, headers):
+        now = time.monotonic()
+        app_bucket = self.app_bucket(host)
+        app_limits = parse_rate_limits(headers.get("X-App-Rate-Limit"))
+        if app_limits:
+            app_bucket.set_limits(app_limits, now)
+        app_bucket.sync_counts(
+            parse_rate_limits(headers.get("X-App-Rate-Limit-Count")), now
+        )
+        method_bucket = self.method_bucket(host, method)
+        method_limits = parse_rate_limits(headers.get("X-Method-Rate-Limit"))
+        if method_limits:
+            method_bucket.set_limits(method_limits, now)
+        method_bucket.sync_counts(
+            parse_rate_limits(headers.get("X-Method-Rate-Limit-Count")), now
+        )
+        self._wake(host)
+
+    def retry_after(self, host, method, headers):
+        retry_after = float(headers.get("Retry-After", self.default_retry_after))
+        limit_type = headers.get("X-Rate-Limit-Type", "service")
+        if limit_type == "application":
+            bucket = self.app_bucket(host)
+        else:
+            bucket = self.method_bucket(host, method)
+        bucket.block(retry_after, time.monotonic())
+        log(
+            f"Rate limited ({limit_type}) on {host} for {method}, retrying in {retry_after}s",
+            "WARNING",
+        )
+        return retry_after
+
+    def _wake(self, host):
+        if host not in self.queues or not self.queues[host]:
+            return
+        if host not in self.wakeups:
+            self.wakeups[host] = asyncio.Event()
+        self.wakeups[host].set()
+        if host not in self.dispatchers:
+            self.dispatchers[host] = asyncio.create_task(self._dispatch(host))
+
+    async def _dispatch(self, host):
+        queue = self.queues[host]
+        wakeup = self.wakeups[host]
+        try:
+            while queue:
+                wakeup.clear()
+                delay = self._grant_next(host, queue, time.monotonic())
+                if delay > 0:
+                    try:
+                        await asyncio.wait_for(wakeup.wait(), delay)
+                    except asyncio.TimeoutError:
+                        pass
+        finally:
+            del self.dispatchers[host]
+
+    def _grant_next(self, host, queue, now):
+        app_bucket = self.app_bucket(host)
+        delay = None
+        for entry in sorted(queue):
+            priority, _, method, future = entry
+            if future.done():
+                queue.remove(entry)
+                continue
+            reserve = self.background_reserve if priority > INTERACTIVE else 0.0
+            method_bucket = self.method_bucket(host, method)
+            wait = max(
+                app_bucket.delay(now, reserve), method_bucket.delay(now, reserve)
+            )
+            if wait == 0:
+                app_bucket.consume(now)
+                method_bucket.consume(now)
+                queue.remove(entry)
+                heapq.heapify(queue)
+                future.set_result(None)
+                return 0.0
+            delay = wait if delay is None else min(delay, wait)
+        heapq.heapify(queue)
+        return delay or 0.0
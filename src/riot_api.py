@@ -1,51 +1,40 @@
 import aiohttp
+import asyncio
+import random
+import sys
 import time
 
+from cache import LRUCache, MISSING, ttl_cache, sweep_caches
+from circuit_breaker import CircuitBreaker
 from logger import log
-from game_info import NameTag, GameInfo, PlayerInfo, UserInfo
+from match_decoder import decode_match, loads
+from match_timeline import MatchTimelineIndex
+from metrics import riot_request_latency, riot_responses, riot_retries
+from player_stats import PlayerStats
+from rate_limiter import RateLimiter
+from riot_id_index import riot_ids
+from static_data import static_data
+from game_info import NameTag, GameInfo, PlayerInfo, UserInfo, LiveGame, LivePlayer
 
+MB = 1024 * 1024
 
-def ttl_cache(ttl=60, max_size=128):
-    def wrapper(func):
-        cache = {}
 
-        async def wrapped(*args, **kwargs):
-            key = (args, frozenset(kwargs.items()))
-            if key in cache:
-                if ttl == -1 or cache[key]["time"] + ttl > time.time():
-                    log(
-                        f"Cache hit for {func.__name__} with args: {args}, kwargs: {kwargs}",
-                        "TRACE",
-                    )
-                    return cache[key]["value"]
-            result = await func(*args, **kwargs)
-            if len(cache) > max_size:
-                log(
-                    f"Cache size {max_size} exceeded, removing oldest entry for {func.__name__}",
-                    "TRACE",
-                )
-                cache.pop(next(iter(cache)))
-            log(
-                f"Caching result for {func.__name__} with args: {args}, kwargs: {kwargs}",
-                "TRACE",
-            )
-            cache[key] = {"value": result, "time": time.time()}
-            return result
+def riot_id_key(self, gameName, tagLine):
+    return (gameName.strip().casefold(), tagLine.strip().casefold())
+
+
+class RiotUnavailableError(Exception):
+    def __init__(self, host, reason):
+        super().__init__(f"Riot API on {host} is unavailable: {reason}")
+        self.host = host
+        self.reason = reason
 
-        return wrapped
 
-    return wrapper
+class RiotRateLimitedError(RiotUnavailableError):
+    pass
 
 
 class RiotAPI:
-    queue_types = {
-        400: "Draft",
-        420: "Solo/Duo",
-        430: "Blind",
-        440: "Flex",
-        450: "ARAM",
-        700: "Clash",
-    }
     queue_weight = {
         "UNRANKED": -1,
         "IRON": 0,
@@ -76,10 +65,56 @@ class RiotAPI:
         "VN": "VN2",
     }
 
-    def __init__(self, api_key, region):
+    def __init__(
+        self,
+        api_key,
+        region,
+        timeout=10,
+        connect_timeout=5,
+        max_connections=100,
+        max_connections_per_host=20,
+        dns_cache_ttl=300,
+        keepalive_timeout=60,
+        match_concurrency=8,
+        rate_limiter=None,
+        max_rate_limit_retries=3,
+        max_retries=3,
+        retry_base=0.5,
+        retry_cap=4,
+        request_deadline=15,
+        breaker_threshold=5,
+        breaker_reset=30,
+        not_found_ttl=300,
+        match_store=None,
+        base_url="https://{host}.api.riotgames.com/",
+    ):
         self.api_key = api_key
         self.region = region.upper()
-        self.universal_api_url = f"https://{region}.api.riotgames.com/"
+        self.base_url = base_url
+        self.universal_api_url = base_url.format(host=region)
+        self.timeout = aiohttp.ClientTimeout(total=timeout, connect=connect_timeout)
+        self.max_connections = max_connections
+        self.max_connections_per_host = max_connections_per_host
+        self.dns_cache_ttl = dns_cache_ttl
+        self.keepalive_timeout = keepalive_timeout
+        self.match_concurrency = match_concurrency
+        self.rate_limiter = rate_limiter or RateLimiter()
+        self.max_rate_limit_retries = max_rate_limit_retries
+        self.max_retries = max_retries
+        self.retry_base = retry_base
+        self.retry_cap = retry_cap
+        self.request_deadline = request_deadline
+        self.breaker_threshold = breaker_threshold
+        self.breaker_reset = breaker_reset
+        self.breakers = {}
+        # 404s are remembered for a while so repeated typos never reach Riot
+        self.not_found = LRUCache("RiotNotFound", not_found_ttl, 2 * MB)
+        self.match_store = match_store
+        # a short stale window, /match right after a game has to see that game
+        self.match_timelines = MatchTimelineIndex(self.fetch_matches_ids, stale_ttl=120)
+        self.player_stats = LRUCache("PlayerStats", 24 * 3600, 16 * MB)
+        self.session = None
+        self.sweeper = None
 
     def __str__(self):
         return f"RiotAPI(api_key={self.api_key[:16] + '...'}, region={self.region})"
@@ -87,51 +122,186 @@ class RiotAPI:
     def __repr__(self):
         return str(self)
 
-    async def _make_request(self, url, params):
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url, params=params) as response:
-                data = await response.json()
-
-                if response.status < 200 or response.status >= 300:
-                    log(
-                        f"Request failed: received {response.status} for {url}", "ERROR"
-                    )
-                return data, response.status
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def start(self):
+        if self.session is not None and not self.session.closed:
+            return
+        connector = aiohttp.TCPConnector(
+            limit=self.max_connections,
+            limit_per_host=self.max_connections_per_host,
+            ttl_dns_cache=self.dns_cache_ttl,
+            keepalive_timeout=self.keepalive_timeout,
+        )
+        self.session = aiohttp.ClientSession(connector=connector, timeout=self.timeout)
+        if self.sweeper is None:
+            self.sweeper = asyncio.create_task(sweep_caches())
+        if self.match_store is not None:
+            await self.match_store.open()
+        log(f"Started HTTP session for {self}", "DEBUG")
+
+    async def close(self):
+        if self.sweeper is not None:
+            self.sweeper.cancel()
+            self.sweeper = None
+        if self.match_store is not None:
+            await self.match_store.close()
+        if self.session is None:
+            return
+        await self.session.close()
+        self.session = None
+        self.sweeper = None
+        log(f"Closed HTTP session for {self}", "DEBUG")
+
+    def breaker(self, host):
+        if host not in self.breakers:
+            self.breakers[host] = CircuitBreaker(
+                host, self.breaker_threshold, self.breaker_reset
+            )
+        return self.breakers[host]
+
+    async def _make_request(
+        self, url, params, host, method, raw=False, expect_not_found=False
+    ):
+        if self.session is None or self.session.closed:
+            await self.start()
+        not_found_key = (
+            url,
+            tuple(sorted((k, v) for k, v in params.items() if k != "api_key")),
+        )
+        data = self.not_found.get(not_found_key)
+        if data is not MISSING:
+            log("Known missing resource %s", "TRACE", url)
+            return data, 404
+        breaker = self.breaker(host)
+        if not breaker.allow():
+            raise RiotUnavailableError(
+                host, f"failing fast for another {breaker.retry_in():.0f}s"
+            )
+        deadline = time.monotonic() + self.request_deadline
+        rate_limit_retries = 0
+        attempt = 0
+        while True:
+            # the deadline covers queueing for the rate limit and every attempt
+            try:
+                await asyncio.wait_for(
+                    self.rate_limiter.acquire(host, method),
+                    max(deadline - time.monotonic(), 0),
+                )
+            except asyncio.TimeoutError:
+                log(f"Gave up waiting for the rate limit on {url}", "WARNING")
+                raise RiotRateLimitedError(host, "request deadline passed in queue")
+            timeout = aiohttp.ClientTimeout(
+                total=min(self.timeout.total, max(deadline - time.monotonic(), 0.001)),
+                connect=self.timeout.connect,
+            )
+            start = time.perf_counter()
+            status = data = None
+            try:
+                async with self.session.get(
+                    url, params=params, timeout=timeout
+                ) as response:
+                    riot_request_latency.observe(time.perf_counter() - start, method)
+                    riot_responses.inc(method, response.status)
+                    self.rate_limiter.update(host, method, response.headers)
+                    status = response.status
+                    body = await response.read()
+                    if (
+                        status == 429
+                        and rate_limit_retries < self.max_rate_limit_retries
+                    ):
+                        self.rate_limiter.retry_after(host, method, response.headers)
+                        rate_limit_retries += 1
+                        continue
+                try:
+                    # raw bodies are left for the caller to decode selectively
+                    data = body if raw and status == 200 else loads(body)
+                except ValueError:
+                    # error pages from proxies in front of Riot are often HTML
+                    if status < 200 or 300 <= status < 500:
+                        message = body[:200].decode(errors="replace")
+                        data = {"status": {"status_code": status, "message": message}}
+                reason = f"received {status}"
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                reason = repr(e)
+
+            if status is not None and status < 500 and data is not None:
+                # 4xx is Riot answering, only server errors count against a host
+                breaker.record_success()
+                if status == 404 and not expect_not_found:
+                    self.not_found.set(not_found_key, data)
+                if 200 <= status < 300 or status == 404:
+                    return data, status
+                # anything else is our problem or Riot's, never "not found"
+                log(f"Request failed: received {status} for {url}", "ERROR")
+                if status == 429:
+                    raise RiotRateLimitedError(host, "rate limit retries exhausted")
+                raise RiotUnavailableError(host, f"received {status}")
+
+            breaker.record_failure()
+            attempt += 1
+            delay = random.uniform(0, min(self.retry_cap, self.retry_base * 2**attempt))
+            if (
+                breaker.is_open()
+                or attempt > self.max_retries
+                or time.monotonic() + delay > deadline
+            ):
+                log(f"Giving up on {url} after {attempt} attempts: {reason}", "ERROR")
+                raise RiotUnavailableError(host, reason)
+            log(
+                f"Request to {url} failed ({reason}), retrying in {delay:.2f}s",
+                "WARNING",
+            )
+            riot_retries.inc(method)
+            await asyncio.sleep(delay)
 
     def get_server_url(self, server):
-        return f"https://{server}.api.riotgames.com/"
+        return self.base_url.format(host=server)
 
-    @ttl_cache(ttl=3600 * 24, max_size=1024)
+    @ttl_cache(ttl=3600 * 24, max_bytes=2 * MB, key=riot_id_key)
     async def get_riot_account_puuid(self, gameName, tagLine):
-        log(f"Fetching PUUID for {gameName}#{tagLine} on {self.region}", "DEBUG")
+        log("Fetching PUUID for %s#%s on %s", "DEBUG", gameName, tagLine, self.region)
 
         url = f"{self.universal_api_url}riot/account/v1/accounts/by-riot-id/{gameName}/{tagLine}"
         params = {"api_key": self.api_key}
-        data, status = await self._make_request(url, params)
+        data, status = await self._make_request(
+            url, params, self.region, "account-v1.getByRiotId"
+        )
         if status == 200:
+            riot_ids.add(data.get("gameName"), data.get("tagLine"))
             return data["puuid"]
         log(f"Failed to get PUUID for {gameName}#{tagLine}, status: {status}", "ERROR")
         return None
 
-    @ttl_cache(ttl=3600 * 24, max_size=1024)
+    @ttl_cache(ttl=3600 * 24, max_bytes=2 * MB)
     async def get_riot_nametag_by_puuid(self, puuid):
-        log(f"Fetching NameTag for PUUID {puuid} on {self.region}", "DEBUG")
+        log("Fetching NameTag for PUUID %s on %s", "DEBUG", puuid, self.region)
 
         url = f"{self.universal_api_url}riot/account/v1/accounts/by-puuid/{puuid}"
         params = {"api_key": self.api_key}
-        data, status = await self._make_request(url, params)
+        data, status = await self._make_request(
+            url, params, self.region, "account-v1.getByPuuid"
+        )
         if status == 200:
+            riot_ids.add(data["gameName"], data["tagLine"])
             return NameTag(data["gameName"], data["tagLine"])
         log(f"Failed to get nametag for PUUID {puuid}, status: {status}", "ERROR")
         return None
 
-    @ttl_cache(ttl=3600 * 24, max_size=1024)
+    @ttl_cache(ttl=3600 * 24, max_bytes=4 * MB)
     async def get_summoner_by_puuid(self, puuid, server):
-        log(f"Fetching summoner for PUUID {puuid} on {server}", "DEBUG")
+        log("Fetching summoner for PUUID %s on %s", "DEBUG", puuid, server)
 
         url = f"{self.get_server_url(server)}lol/summoner/v4/summoners/by-puuid/{puuid}"
         params = {"api_key": self.api_key}
-        data, status = await self._make_request(url, params)
+        data, status = await self._make_request(
+            url, params, server, "summoner-v4.getByPUUID"
+        )
         if status == 200:
             data["status_code"] = status
             data["message"] = "Summoner found"
@@ -140,122 +310,204 @@ class RiotAPI:
             f"Failed to get summoner for PUUID {puuid} on {server}, status: {status}",
             "ERROR",
         )
-        return data.get("status", status)
+        return None
 
-    @ttl_cache()
-    async def get_matches_ids_by_puuid(self, puuid, count=20, start=0):
+    async def get_active_game(self, puuid, server):
+        log("Fetching active game for PUUID %s on %s", "DEBUG", puuid, server)
+
+        url = f"{self.get_server_url(server)}lol/spectator/v5/active-games/by-summoner/{puuid}"
+        params = {"api_key": self.api_key}
+        # 404 means not in a game, which can change any moment
+        data, status = await self._make_request(
+            url,
+            params,
+            server,
+            "spectator-v5.getCurrentGameInfoByPuuid",
+            expect_not_found=True,
+        )
+        if status == 200:
+            return self.parse_active_game(data)
+        return None
+
+    def parse_active_game(self, data):
+        participants = []
+        for participant in data["participants"]:
+            name = None
+            game_name, _, tag = participant.get("riotId", "").partition("#")
+            if game_name and tag:
+                name = NameTag(game_name, tag)
+                riot_ids.add(name.name, name.tag)
+            team = "Blue" if participant["teamId"] == 100 else "Red"
+            player = LivePlayer(
+                participant.get("puuid"), name, participant["championId"], team
+            )
+            participants.append(player)
+        queue_id = data.get("gameQueueConfigId", 0)
+        return LiveGame(
+            data["gameId"],
+            data["gameStartTime"],
+            static_data.queue_name(queue_id),
+            queue_id,
+            tuple(participants),
+        )
+
+    async def fetch_matches_ids(self, puuid, start, count, start_time=None):
         log(
-            f"Fetching match IDs for PUUID {puuid} with count {count} on {self.region}",
+            "Fetching %d match IDs from %d for PUUID %s on %s",
             "DEBUG",
+            count,
+            start,
+            puuid,
+            self.region,
         )
 
         url = f"{self.universal_api_url}lol/match/v5/matches/by-puuid/{puuid}/ids"
         params = {"api_key": self.api_key, "count": count, "start": start}
-        data, status = await self._make_request(url, params)
+        if start_time is not None:
+            params["startTime"] = start_time
+        data, status = await self._make_request(
+            url, params, self.region, "match-v5.getMatchIdsByPUUID"
+        )
         if status == 200:
             return data
         log(f"Failed to get match IDs for PUUID {puuid}, status: {status}", "ERROR")
-        return []
+        return None
+
+    async def get_matches_ids_by_puuid(self, puuid, count=20, start=0):
+        return await self.match_timelines.get(puuid, start, count)
+
+    def decode_match_body(self, match_id, body):
+        try:
+            return decode_match(body)
+        except ValueError as e:
+            log(f"Failed to decode match {match_id}: {e}", "ERROR")
+            return None
 
-    @ttl_cache(ttl=3600 * 24)
     async def get_raw_match_info_by_id(self, match_id):
+        # only the fields parse_match_info reads are decoded, see match_decoder
+        if self.match_store is not None:
+            body = await self.match_store.get(match_id)
+            if body is not None:
+                log("Loaded match %s from %s", "TRACE", match_id, self.match_store)
+                return self.decode_match_body(match_id, body)
+
         log(
-            f"Fetching raw match info for match ID {match_id} on {self.region}", "DEBUG"
+            "Fetching raw match info for match ID %s on %s",
+            "DEBUG",
+            match_id,
+            self.region,
         )
 
         url = f"{self.universal_api_url}lol/match/v5/matches/{match_id}"
         params = {"api_key": self.api_key}
-        data, status = await self._make_request(url, params)
-        if status == 200:
-            data["status_code"] = status
-            data["message"] = "Match found"
-            return data
-        log(f"Failed to get match info for {match_id}, status: {status}", "ERROR")
-        return data.get("status", status)
+        body, status = await self._make_request(
+            url, params, self.region, "match-v5.getMatch", raw=True
+        )
+        if status != 200:
+            log(f"Failed to get match info for {match_id}, status: {status}", "ERROR")
+            return None
+        data = self.decode_match_body(match_id, body)
+        if data is not None and self.match_store is not None:
+            await self.match_store.put(match_id, body)
+        return data
 
-    @ttl_cache()
+    @ttl_cache(max_bytes=2 * MB, stale_ttl=600)
     async def get_ranked_info(self, puuid, server):
-        log(f"Fetching ranked info for PUUID {puuid} on {server}", "DEBUG")
+        log("Fetching ranked info for PUUID %s on %s", "DEBUG", puuid, server)
 
         url = f"{self.get_server_url(server)}lol/league/v4/entries/by-puuid/{puuid}"
         params = {"api_key": self.api_key}
-        ranks = []
-        data, status = await self._make_request(url, params)
-        if status == 200:
-            for rankData in data:
-                if "rank" not in rankData:
-                    continue
-                queue = rankData["queueType"]
-                tier = rankData["tier"]
-                rank = rankData["rank"]
-                lp = rankData["leaguePoints"]
-                wins = rankData["wins"]
-                losses = rankData["losses"]
-                rankArray = [queue, tier, rank, lp, wins, losses]
-                ranks.append(rankArray)
-        else:
+        data, status = await self._make_request(
+            url, params, server, "league-v4.getLeagueEntriesByPUUID"
+        )
+        if status != 200:
+            # None isn't cached, unlike the empty list of an unranked player
             log(
                 f"Failed to get ranked info for PUUID {puuid} on {server}, status: {status}",
                 "ERROR",
             )
+            return None
+        ranks = []
+        for rankData in data:
+            if "rank" not in rankData:
+                continue
+            queue = rankData["queueType"]
+            tier = rankData["tier"]
+            rank = rankData["rank"]
+            lp = rankData["leaguePoints"]
+            wins = rankData["wins"]
+            losses = rankData["losses"]
+            rankArray = [queue, tier, rank, lp, wins, losses]
+            ranks.append(rankArray)
         return ranks
 
-    @ttl_cache()
+    def parse_mastery_info(self, data):
+        champions = []
+        for champion in data:
+            id = champion["championId"]
+            level = champion["championLevel"]
+            points = champion["championPoints"]
+            last_play = champion["lastPlayTime"]
+            champions.append([id, level, points, last_play])
+        return champions
+
+    @ttl_cache(max_bytes=8 * MB, stale_ttl=3600)
     async def get_mastery_info(self, puuid, server):
-        log(f"Fetching mastery info for PUUID {puuid} on {server}", "DEBUG")
+        log("Fetching mastery info for PUUID %s on %s", "DEBUG", puuid, server)
 
         url = f"{self.get_server_url(server)}lol/champion-mastery/v4/champion-masteries/by-puuid/{puuid}"
         params = {"api_key": self.api_key}
-        champions = []
-        data, status = await self._make_request(url, params)
+        data, status = await self._make_request(
+            url, params, server, "champion-mastery-v4.getAllChampionMasteriesByPUUID"
+        )
         if status == 200:
-            for champion in data:
-                id = champion["championId"]
-                level = champion["championLevel"]
-                points = champion["championPoints"]
-                last_play = champion["lastPlayTime"]
-                champions.append([id, level, points, last_play])
-        else:
-            log(
-                f"Failed to get mastery info for PUUID {puuid} on {server}, status: {status}",
-                "ERROR",
-            )
-        return champions
+            return self.parse_mastery_info(data)
+        log(
+            f"Failed to get mastery info for PUUID {puuid} on {server}, status: {status}",
+            "ERROR",
+        )
+        return None
 
-    async def get_recent_matches_ids(self, puuid, server, count=20):
+    async def get_mastery_summary(self, puuid, server):
+        # total points can only be summed from the full mastery list
+        champions = await self.get_mastery_info(puuid, server)
+        if champions is None:
+            return None
+        total_mastery = sum(champion[1] for champion in champions)
+        total_points = sum(champion[2] for champion in champions)
+        return champions[:3], total_mastery, total_points
+
+    async def get_recent_matches_ids(self, puuid, server, count=20, start=0):
         summoner_data = await self.get_summoner_by_puuid(puuid, server)
-        if (
-            not isinstance(summoner_data, dict)
-            or summoner_data.get("status_code") != 200
-        ):
+        if summoner_data is None:
             return [[], summoner_data]
         summoner_puuid = summoner_data["puuid"]
         return [
-            await self.get_matches_ids_by_puuid(summoner_puuid, count=count),
+            await self.get_matches_ids_by_puuid(
+                summoner_puuid, count=count, start=start
+            ),
             summoner_data,
         ]
 
-    async def get_match_info_by_id(self, match_id, load_name_tags=False):
-        raw_data = await self.get_raw_match_info_by_id(match_id)
-        if not isinstance(raw_data, dict) or raw_data.get("status_code") != 200:
-            return None
+    def parse_match_info(self, match_id, raw_data):
         start_time = raw_data["info"]["gameStartTimestamp"]
         game_duration = raw_data["info"]["gameDuration"]
-        queueId = raw_data["info"]["queueId"]
-        queue_type = "Other"
-        if queueId in self.queue_types:
-            queue_type = self.queue_types[queueId]
+        queue_type = static_data.queue_name(raw_data["info"]["queueId"])
         winner = "Blue"
         participants = []
         for participant in raw_data["info"]["participants"]:
             puuid = participant["puuid"]
-            name = (
-                await self.get_riot_nametag_by_puuid(puuid) if load_name_tags else None
-            )
+            name = None
+            if participant.get("riotIdGameName") and participant.get("riotIdTagline"):
+                name = NameTag(
+                    participant["riotIdGameName"], participant["riotIdTagline"]
+                )
+                riot_ids.add(name.name, name.tag)
             kills = participant["kills"]
             deaths = participant["deaths"]
             assists = participant["assists"]
-            champion_name = participant["championName"]
+            # repeated in every match, so share one string object per value
+            champion_name = sys.intern(participant["championName"])
             champion_id = participant["championId"]
             gold_earned = participant["goldEarned"]
             damage = participant["totalDamageDealtToChampions"]
@@ -268,13 +520,13 @@ class RiotAPI:
                 team = "Blue"
             if participant["win"] and team == "Red":
                 winner = "Red"
-            multikills = [
+            multikills = (
                 participant["doubleKills"],
                 participant["tripleKills"],
                 participant["quadraKills"],
                 participant["pentaKills"],
-            ]
-            position = participant["individualPosition"]
+            )
+            position = sys.intern(participant["individualPosition"])
             player_info = PlayerInfo(
                 puuid,
                 name,
@@ -292,37 +544,123 @@ class RiotAPI:
                 position,
             )
             participants.append(player_info)
-        game_info = GameInfo(
-            match_id, start_time, game_duration, winner, participants, queue_type
+        return GameInfo(
+            match_id,
+            start_time,
+            game_duration,
+            winner,
+            tuple(participants),
+            queue_type,
+            raw_data["info"]["queueId"],
         )
+
+    @ttl_cache(ttl=3600 * 24, max_bytes=32 * MB)
+    async def get_game_info_by_id(self, match_id):
+        raw_data = await self.get_raw_match_info_by_id(match_id)
+        if raw_data is None:
+            return None
+        return self.parse_match_info(match_id, raw_data)
+
+    async def get_match_info_by_id(self, match_id, load_name_tags=False):
+        game_info = await self.get_game_info_by_id(match_id)
+        if game_info is None or not load_name_tags:
+            return game_info
+        missing = [player for player in game_info.participants if player.name is None]
+        if missing:
+            log(
+                "Resolving %d missing name tags for %s", "DEBUG", len(missing), match_id
+            )
+            semaphore = asyncio.Semaphore(self.match_concurrency)
+
+            async def resolve(player):
+                async with semaphore:
+                    player.name = await self.get_riot_nametag_by_puuid(player.puuid)
+
+            await asyncio.gather(*(resolve(player) for player in missing))
         return game_info
 
     async def get_recent_matches_infos(self, puuid, server, count=20):
-        matches_infos = []
         data = await self.get_recent_matches_ids(puuid, server, count)
-        for match_id in data[0]:
-            match_info = await self.get_match_info_by_id(match_id)
-            if match_info is not None:
-                matches_infos.append(match_info)
-        return [matches_infos, data[1]]
+        results = [None] * len(data[0])
+        async for index, match_info in self.stream_matches_infos(data[0]):
+            results[index] = match_info
+        return [[match for match in results if match is not None], data[1]]
+
+    async def stream_matches_infos(self, match_ids, load_name_tags=False):
+        # yields (index, GameInfo or None on failure) as each match finishes
+        semaphore = asyncio.Semaphore(self.match_concurrency)
+        unavailable = []
+
+        async def fetch(index, match_id):
+            async with semaphore:
+                try:
+                    return index, await self.get_match_info_by_id(
+                        match_id, load_name_tags
+                    )
+                except Exception as e:
+                    log(f"Failed to load match {match_id}: {e!r}", "ERROR")
+                    if isinstance(e, RiotUnavailableError):
+                        unavailable.append(e)
+                    return index, None
+
+        tasks = [
+            asyncio.ensure_future(fetch(index, match_id))
+            for index, match_id in enumerate(match_ids)
+        ]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            for task in tasks:
+                task.cancel()
+        # one bad match is skipped, but if Riot failed them all there is no
+        # history to show and callers must not report the player as empty
+        if match_ids and len(unavailable) == len(match_ids):
+            raise unavailable[-1]
+
+    async def get_player_stats(self, puuid, count=100, queue_id=None):
+        match_ids = await self.get_matches_ids_by_puuid(puuid, count)
+        if not match_ids:
+            return None
+        stats = self.player_stats.get(puuid)
+        if stats is MISSING:
+            stats = PlayerStats()
+        # only games that aren't in the player's columns yet are loaded
+        missing = [match_id for match_id in match_ids if match_id not in stats]
+        if missing:
+            log("Loading %d new games into stats of %s", "DEBUG", len(missing), puuid)
+            async for _, game_info in self.stream_matches_infos(missing):
+                if game_info is not None:
+                    stats.add(game_info, puuid)
+            stats.trim()
+            # set again so the cache accounts for the grown columns
+            self.player_stats.set(puuid, stats)
+        return stats.aggregate(match_ids, queue_id)
 
     async def get_recent_match_info(self, puuid, server, id=0):
-        match_data = await self.get_recent_matches_ids(puuid, server, id + 1)
-        if len(match_data[0]) > id:
+        match_data = await self.get_recent_matches_ids(puuid, server, 1, start=id)
+        if len(match_data[0]) > 0:
             return await self.get_match_info_by_id(
-                match_data[0][id], load_name_tags=True
+                match_data[0][0], load_name_tags=True
             )
         return None
 
     async def get_profile_info(self, puuid, server):
-        summoner = await self.get_summoner_by_puuid(puuid, server)
-        if not isinstance(summoner, dict) or summoner.get("status_code") != 200:
+        # the Riot ID lives on the regional host, so it can load alongside the summoner
+        summoner, name = await asyncio.gather(
+            self.get_summoner_by_puuid(puuid, server),
+            self.get_riot_nametag_by_puuid(puuid),
+        )
+        if summoner is None:
             return {"status_code": 404, "message": "Summoner not found"}
-        puuid = summoner["puuid"]
-        name = await self.get_riot_nametag_by_puuid(puuid)
+        # no account on this server means no ranks or mastery either, so only
+        # spend those requests once the summoner exists
+        ranks, mastery = await asyncio.gather(
+            self.get_ranked_info(puuid, server),
+            self.get_mastery_summary(puuid, server),
+        )
         level = summoner["summonerLevel"]
         icon = summoner["profileIconId"]
-        ranks = await self.get_ranked_info(puuid, server)
         rank_solo = "UNRANKED"
         rank_flex = "UNRANKED"
         lp_solo = 0
@@ -332,7 +670,7 @@ class RiotAPI:
         wins_flex = 0
         losses_flex = 0
         max_division = "UNRANKED"
-        for rank in ranks:
+        for rank in ranks or ():
             if rank[0] == "RANKED_SOLO_5x5":
                 rank_solo = f"{rank[1]} {rank[2]}"
                 lp_solo = rank[3]
@@ -349,13 +687,7 @@ class RiotAPI:
             ):
                 max_division = rank[1].upper()
 
-        champions = await self.get_mastery_info(puuid, server)
-        top_champs = champions[:3]
-        total_mastery = 0
-        total_points = 0
-        for champion in champions:
-            total_mastery += champion[1]
-            total_points += champion[2]
+        top_champs, total_mastery, total_points = mastery or ([], 0, None)
         user = UserInfo(
             puuid,
             name,
@@ -0,0 +1,88 @@
+import bisect
+from collections import OrderedDict
+
+from game_info import NameTag
+
+
+def index_key(name, tag=""):
+    return f"{name.strip().casefold()}#{tag.strip().casefold()}"
+
+
+class RiotIdIndex:
+    def __init__(self, max_entries=100_000, max_guild_entries=500, max_scan=1000):
+        self.max_entries = max_entries
+        self.max_guild_entries = max_guild_entries
+        self.max_scan = max_scan
+        # sorted keys for prefix lookups, names keeps display casing and LRU order
+        self.keys = []
+        self.names = OrderedDict()
+        self.lookups = {}
+        self.guilds = {}
+
+    def __len__(self):
+        return len(self.keys)
+
+    def add(self, name, tag):
+        if not name or not tag:
+            return None
+        key = index_key(name, tag)
+        if key in self.names:
+            self.names.move_to_end(key)
+            return key
+        self.names[key] = NameTag(name, tag)
+        bisect.insort(self.keys, key)
+        if len(self.names) > self.max_entries:
+            self.remove(next(iter(self.names)))
+        return key
+
+    def remove(self, key):
+        self.names.pop(key, None)
+        self.lookups.pop(key, None)
+        index = bisect.bisect_left(self.keys, key)
+        if index < len(self.keys) and self.keys[index] == key:
+            del self.keys[index]
+
+    def record(self, guild_id, name, tag):
+        key = self.add(name, tag)
+        if key is None:
+            return
+        self.lookups[key] = self.lookups.get(key, 0) + 1
+        if guild_id is None:
+            return
+        guild = self.guilds.setdefault(guild_id, OrderedDict())
+        guild[key] = guild.get(key, 0) + 1
+        guild.move_to_end(key)
+        if len(guild) > self.max_guild_entries:
+            guild.popitem(last=False)
+
+    def search(self, prefix, guild_id=None, limit=25):
+        guild = self.guilds.get(guild_id, {})
+        matches = []
+        start = bisect.bisect_left(self.keys, prefix)
+        for key in self.keys[start : start + self.max_scan]:
+            if not key.startswith(prefix):
+                break
+            matches.append(key)
+        # the scan is capped, so a guild's own lookups may be past its end
+        seen = set(matches)
+        matches.extend(
+            key
+            for key in guild
+            if key.startswith(prefix) and key not in seen and key in self.names
+        )
+        # the guild's own lookups first, then anything looked up anywhere
+        matches.sort(key=lambda key: (-guild.get(key, 0), -self.lookups.get(key, 0)))
+        return [self.names[key] for key in matches[:limit]]
+
+    def complete_name(self, current, guild_id=None, limit=25):
+        name, _, tag = current.partition("#")
+        prefix = index_key(name, tag) if tag else name.strip().casefold()
+        return self.search(prefix, guild_id, limit)
+
+    def complete_tag(self, name, current, guild_id=None, limit=25):
+        if not name:
+            return []
+        return self.search(index_key(name, current), guild_id, limit)
+
+
+riot_ids = RiotIdIndex()
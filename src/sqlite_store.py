@@ -0,0 +1,66 @@
+import asyncio
+import os
+import sqlite3
+import threading
+
+from logger import log
+
+
+class SQLiteStore:
+    # migrations[i] upgrades the schema from version i to i + 1, queries run
+    # in worker threads and share one connection behind self.lock
+    def __init__(self, path, migrations):
+        self.path = path
+        self.migrations = migrations
+        self.lock = threading.Lock()
+        self.connection = None
+
+    async def open(self):
+        await asyncio.to_thread(self._open)
+
+    async def close(self):
+        await asyncio.to_thread(self._close)
+
+    async def run(self, action, function, *args, default=None):
+        try:
+            return await asyncio.to_thread(function, *args)
+        except sqlite3.Error as e:
+            log(f"Failed to {action} {self}: {e}", "ERROR")
+            return default
+
+    def _open(self):
+        with self.lock:
+            if self.connection is not None:
+                return
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self.connection = sqlite3.connect(self.path, check_same_thread=False)
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self._migrate()
+            self._opened()
+
+    def _opened(self):
+        pass
+
+    def _close(self):
+        with self.lock:
+            if self.connection is None:
+                return
+            self.connection.close()
+            self.connection = None
+
+    def _migrate(self):
+        schema_version = len(self.migrations)
+        version = self.connection.execute("PRAGMA user_version").fetchone()[0]
+        if version > schema_version:
+            version = self._newer_schema(version)
+        with self.connection:
+            for statements in self.migrations[version:]:
+                for statement in statements:
+                    self.connection.execute(statement)
+            self.connection.execute(f"PRAGMA user_version = {schema_version}")
+
+    def _newer_schema(self, version):
+        # written by a newer bot, by default keep the data as it is
+        return version
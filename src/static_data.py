@@ -0,0 +1,178 @@
+import aiohttp
+import asyncio
+import json
+import os
+
+from logger import log
+
+DDRAGON_URL = "https://ddragon.leagueoflegends.com/"
+QUEUES_URL = "https://static.developer.riotgames.com/docs/lol/queues.json"
+BUNDLED_PATH = os.path.join(os.path.dirname(__file__), "static", "static_data.json")
+CACHE_FILE = "static_data.json"
+
+# short labels for the queues people actually play, Riot's descriptions are long
+queue_short_names = {
+    400: "Draft",
+    420: "Solo/Duo",
+    430: "Blind",
+    440: "Flex",
+    450: "ARAM",
+    490: "Quickplay",
+    700: "Clash",
+    900: "ARURF",
+    1700: "Arena",
+    1900: "URF",
+}
+
+
+def version_key(version):
+    return tuple(int(part) for part in version.split(".") if part.isdigit())
+
+
+def repair_champ_name(champ_name):
+    new_champ_name = ""
+    for i in champ_name:
+        if i <= "Z" and new_champ_name != "":
+            new_champ_name += " " + i
+        else:
+            new_champ_name += i
+    return new_champ_name
+
+
+class StaticData:
+    def __init__(self, refresh_interval=3600 * 6, timeout=30):
+        self.refresh_interval = refresh_interval
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.cache_dir = None
+        self.refresher = None
+        self.version = None
+        self.champion_keys = {}
+        self.champion_names = {}
+        self.key_names = {}
+        self.queue_names = {}
+        self.load(BUNDLED_PATH)
+
+    def __str__(self):
+        return (
+            f"StaticData(version={self.version}, champions={len(self.champion_names)})"
+        )
+
+    def load(self, path):
+        try:
+            with open(path, encoding="utf-8") as file:
+                data = json.load(file)
+            if self.version is not None and version_key(data["version"]) < version_key(
+                self.version
+            ):
+                log(f"Ignoring static data for older patch {data['version']} in {path}")
+                return False
+            self.apply(data)
+        except (OSError, ValueError, KeyError, TypeError, AttributeError) as e:
+            log(f"Failed to load static data from {path}: {e!r}", "WARNING")
+            return False
+        log(f"Loaded {self} from {path}", "DEBUG")
+        return True
+
+    def apply(self, data):
+        champion_keys = {}
+        champion_names = {}
+        key_names = {}
+        for id, champion in data["champions"].items():
+            champion_keys[int(id)] = champion["key"]
+            champion_names[int(id)] = champion["name"]
+            key_names[champion["key"].casefold()] = champion["name"]
+        # everything is read before anything is replaced, so a broken file
+        # leaves the previous data in place
+        queue_names = {int(id): name for id, name in data["queues"].items()}
+        version = data["version"]
+        self.champion_keys = champion_keys
+        self.champion_names = champion_names
+        self.key_names = key_names
+        self.queue_names = queue_names
+        self.version = version
+
+    def champion_name(self, champion_id, champion_key=None):
+        if champion_id in self.champion_names:
+            return self.champion_names[champion_id]
+        if champion_key is None:
+            return None
+        return self.key_names.get(champion_key.casefold()) or repair_champ_name(
+            champion_key
+        )
+
+    def queue_name(self, queue_id):
+        return self.queue_names.get(queue_id, "Other")
+
+    def icon_url(self, icon_id):
+        return f"{DDRAGON_URL}cdn/{self.version}/img/profileicon/{icon_id}.png"
+
+    async def start(self, cache_dir=None):
+        self.cache_dir = cache_dir
+        if cache_dir is not None:
+            self.load(os.path.join(cache_dir, CACHE_FILE))
+        if self.refresher is None:
+            self.refresher = asyncio.create_task(self.refresh_loop())
+
+    async def close(self):
+        if self.refresher is not None:
+            self.refresher.cancel()
+            self.refresher = None
+
+    async def refresh_loop(self):
+        while True:
+            try:
+                await self.refresh()
+            except (
+                aiohttp.ClientError,
+                OSError,
+                asyncio.TimeoutError,
+                KeyError,
+                ValueError,
+            ) as e:
+                log(f"Failed to refresh static data: {e!r}", "WARNING")
+            await asyncio.sleep(self.refresh_interval)
+
+    async def refresh(self):
+        async with aiohttp.ClientSession(timeout=self.timeout) as session:
+            versions = await self.fetch_json(session, f"{DDRAGON_URL}api/versions.json")
+            version = versions[0]
+            if version_key(version) <= version_key(self.version or "0"):
+                return
+            log(f"Downloading static data for patch {version}", "INFO")
+            cdn = f"{DDRAGON_URL}cdn/{version}/data/en_US/"
+            champions, queues = await asyncio.gather(
+                self.fetch_json(session, f"{cdn}champion.json"),
+                self.fetch_json(session, QUEUES_URL),
+            )
+        data = {
+            "version": version,
+            "champions": {
+                champion["key"]: {"key": champion["id"], "name": champion["name"]}
+                for champion in champions["data"].values()
+            },
+            "queues": {
+                queue["queueId"]: queue["description"].removesuffix(" games")
+                for queue in queues
+                if queue.get("description")
+            },
+        }
+        data["queues"].update(queue_short_names)
+        self.apply(data)
+        log(f"Refreshed {self}", "INFO")
+        if self.cache_dir is not None:
+            await asyncio.to_thread(self.save, data)
+
+    async def fetch_json(self, session, url):
+        async with session.get(url) as response:
+            response.raise_for_status()
+            return await response.json(content_type=None)
+
+    def save(self, data):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = os.path.join(self.cache_dir, CACHE_FILE)
+        with open(f"{path}.tmp", "w", encoding="utf-8") as file:
+            json.dump(data, file, ensure_ascii=False)
+        os.replace(f"{path}.tmp", path)
+
+
+static_data = StaticData()